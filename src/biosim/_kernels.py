@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Herman Ellingsen, Ole Gilje Gunnarshaug'
+__email__ = 'hermane@nmbu.no, ole.gilje.gunnarshaug@nmbu.no'
+"""
+Numba-compiled kernels for the annual cycle of a cell.
+
+The kernels work directly on the arrays stored in :class:`biosim.cell.Cell`, and get the
+parameters of the species as plain floats. They are compiled the first time they are called,
+and the compiled code is cached on disk.
+
+Random numbers are drawn from the :class:`numpy.random.Generator` given as ``rng``, which is
+the generator of the cell the kernel works on. Parallel kernels get their random numbers
+drawn in advance instead, since a generator can not be shared between threads.
+"""
+
+import math
+import numpy as np
+from numba import njit, prange
+
+
+@njit(cache=True, fastmath=True)
+def fitness(age, weight, phi_age, a_half, phi_weight, w_half):
+    """
+    Computes the fitness of a population, see :meth:`biosim.animal.Animal.fitness_update`.
+
+    Ages are integers, and most animals share an age with many others. The age factor is
+    therefore computed once for each age up to the oldest animal and looked up in a table,
+    so only the weight factor needs one exp per animal.
+
+    :return: Fitness of each animal
+    :rtype: numpy array
+    """
+    result = np.empty(len(weight))
+    if len(weight) == 0:
+        return result
+    age_factor = np.empty(age.max() + 1)
+    for a in range(len(age_factor)):
+        age_factor[a] = 1 / (1 + math.exp(phi_age * (a - a_half)))
+    for i in range(len(weight)):
+        if weight[i] <= 0:
+            result[i] = 0.0
+        else:
+            result[i] = age_factor[age[i]] / (1 + math.exp(-phi_weight * (weight[i] - w_half)))
+    return result
+
+
+@njit(cache=True)
+def herbivores_eat(fitness, weight, eaten, fitness_dirty, fodder, F, beta):
+    """
+    Lets the herbivores of a cell eat in order of descending fitness, each eating F or what
+    is left of the fodder. Weight, eaten and fitness_dirty of the herbivores are updated in
+    place.
+
+    Only the ceil(fodder / F) fittest herbivores can get any fodder. When that is fewer than
+    all of them, they are found with a partial sort, and only they are sorted. Herbivores
+    that share the fitness of the last one are included as well, so ties are ordered the
+    same way as by a stable sort of all herbivores.
+
+    :return: Fodder left in the cell
+    :rtype: float
+    """
+    n = len(fitness)
+    k = n if F <= 0 else min(n, int(math.ceil(fodder / F)))
+    if k <= 0:
+        return fodder
+    if k < n:
+        threshold = np.partition(-fitness, k - 1)[k - 1]
+        candidates = np.flatnonzero(-fitness <= threshold)
+    else:
+        candidates = np.arange(n)
+    for i in candidates[np.argsort(-fitness[candidates], kind="mergesort")]:
+        if fodder <= 0:
+            break
+        food = min(F, fodder)
+        weight[i] += beta * food
+        eaten[i] += food
+        fitness_dirty[i] = True
+        fodder -= food
+    return fodder
+
+
+@njit(cache=True, error_model="numpy")
+def carnivores_eat(rng, carn_age, carn_fitness, carn_weight, carn_eaten, herb_fitness,
+                   herb_weight, delta_phi_max, beta, F, phi_age, a_half, phi_weight, w_half):
+    """
+    Lets each carnivore of a cell hunt the herbivores in the order they are stored, which is
+    expected to be by ascending fitness. Weight, fitness and eaten of the carnivores are updated
+    in place. The fitness of a carnivore is recomputed after each kill, as in
+    :meth:`biosim.animal.Animal.feed`, since it changes the chance to kill the next one.
+
+    The herbivores that are killed are marked in one boolean mask, so the herbivores are only
+    removed once, after all carnivores have eaten. A carnivore stops hunting when it has
+    eaten F, or when it reaches a herbivore that is at least as fit as itself, since it can
+    not kill that one or any of the fitter ones after it. No random number is drawn for
+    herbivores that can not be killed.
+
+    :return: Boolean mask of the herbivores that survive
+    :rtype: numpy array
+    """
+    alive = np.ones(len(herb_fitness), dtype=np.bool_)
+    for c in range(len(carn_fitness)):
+        for h in range(len(herb_fitness)):
+            if carn_eaten[c] >= F or carn_fitness[c] <= herb_fitness[h]:
+                break
+            if not alive[h]:
+                continue
+            kill_proba = min(1.0, (carn_fitness[c] - herb_fitness[h]) / delta_phi_max)
+            if kill_proba > rng.random():
+                food = min(herb_weight[h], F - carn_eaten[c])
+                carn_weight[c] += beta * food
+                carn_fitness[c] = (1 / (1 + math.exp(phi_age * (carn_age[c] - a_half)))
+                                   / (1 + math.exp(-phi_weight * (carn_weight[c] - w_half))))
+                carn_eaten[c] += food
+                alive[h] = False
+    return alive
+
+
+@njit(cache=True, parallel=True, fastmath=True)
+def age_and_death(age, weight, fitness, u, eta, omega, phi_age, a_half, phi_weight, w_half):
+    """
+    Ages each animal by one year, applies the annual weight loss, updates the fitness and
+    decides if the animal dies, see :meth:`biosim.animal.Animal.animal_dies`. Age, weight and
+    fitness are updated in place. The animals are handled in parallel.
+
+    :param u: One uniform random number in [0, 1) for each animal
+    :return: Boolean mask of the animals that survive
+    :rtype: numpy array
+    """
+    alive = np.empty(len(weight), dtype=np.bool_)
+    for i in prange(len(weight)):
+        age[i] += 1
+        weight[i] *= 1 - eta
+        if weight[i] <= 0:
+            fitness[i] = 0.0
+            alive[i] = False
+        else:
+            fitness[i] = (1 / (1 + math.exp(phi_age * (age[i] - a_half)))
+                          / (1 + math.exp(-phi_weight * (weight[i] - w_half))))
+            alive[i] = omega * (1 - fitness[i]) <= u[i]
+    return alive
@@ -5,27 +5,47 @@ __email__ = 'hermane@nmbu.no, ole.gilje.gunnarshaug@nmbu.no'
 
 import random
 import math
+from . import _kernels
 
 
 class Animal:
     """
     Class for animals
     """
-    animal_count = 0
+    __slots__ = ("age", "weight", "fitness", "has_moved", "amount_eaten")
+
+    def __init_subclass__(cls, **kwargs):
+        """Cache the default parameters of a new species as class attributes."""
+        super().__init_subclass__(**kwargs)
+        cls.cache_params()
+
+    @classmethod
+    def cache_params(cls):
+        """
+        Stores each parameter as a class attribute with a leading underscore, e.g.
+        ``cls._phi_age``, so the methods do not have to look them up in the dictionary.
+        This is called by :meth:`set_params`, so the parameters must be changed through it.
+        """
+        for key, value in cls.params.items():
+            setattr(cls, f"_{key}", value)
 
     @classmethod
     def set_params(cls, dicto):
         """
-        This function sets new parameters as class attributes.
+        This function sets new parameters as class attributes. All parameters are checked
+        before any of them is changed, so the parameters are left as they were if one of them
+        is invalid.
+
         :param dicto: Dictionary containing parameter values.
         :type dicto: dict
         """
-
-        for key in cls.params:
-            if key in dicto:
-                if dicto[key] < 0:
-                    raise ValueError("Cant be below zero")
-                cls.params.update(dicto)
+        for key, value in dicto.items():
+            if key not in cls.params:
+                raise ValueError(f"Unknown parameter: {key}")
+            if value < 0:
+                raise ValueError("Cant be below zero")
+        cls.params.update(dicto)
+        cls.cache_params()
 
     @classmethod
     def get_params(cls):
@@ -37,6 +57,22 @@ class Animal:
         """
         return cls.params
 
+    @classmethod
+    def fitness_array(cls, age, weight):
+        """
+        Vectorized version of :meth:`fitness_update`. Computes the fitness for a whole
+        population at once, given its ages and weights as arrays.
+
+        :param age: Ages of the animals
+        :type age: numpy array
+        :param weight: Weights of the animals
+        :type weight: numpy array
+        :return: Fitness of the animals
+        :rtype: numpy array
+        """
+        return _kernels.fitness(age, weight, cls._phi_age, cls._a_half,
+                                cls._phi_weight, cls._w_half)
+
     def __init__(self, age, weight):
         """
         This initializes an animal instance.
@@ -46,16 +82,20 @@ class Animal:
         :param weight: Initial weight
         :type weight: int or float
         """
-        type(self).animal_count += 1
         self.age = age
         self.weight = weight
         self.has_moved = False
         self.amount_eaten = 0
-        self.hungry = True
 
-    def __del__(self):
-        """Remove 1 when animal is removed."""
-        type(self).animal_count -= 1
+    @property
+    def hungry(self):
+        """
+        An animal is hungry until it has eaten its appetite F in the current year.
+
+        :return: True if the animal can eat more
+        :rtype: bool
+        """
+        return self.amount_eaten < self._F
 
     def get_params(self):
         """
@@ -81,7 +121,7 @@ class Animal:
         :param food_to_eat: Amount of food to feed the animal
         :type food_to_eat: int
         """
-        self.weight += food_to_eat*self.params["beta"]
+        self.weight += food_to_eat*self._beta
         self.amount_eaten += food_to_eat
         self.fitness_update()
 
@@ -90,7 +130,7 @@ class Animal:
         Function updates weight of animal according to annual weight loss set
         by given parameters "eta" and its own weight.
         """
-        self.weight -= self.params["eta"]*self.weight
+        self.weight -= self._eta*self.weight
         self.fitness_update()
 
     def fitness_update(self):
@@ -121,8 +161,8 @@ class Animal:
         if self.weight <= 0:
             self.fitness = 0
         else:
-            age_part = 1/(1+math.exp(self.params["phi_age"]*(self.age-self.params["a_half"])))
-            weight_part = 1/(1+math.exp(-self.params["phi_weight"]*(self.weight-self.params["w_half"])))
+            age_part = 1/(1+math.exp(self._phi_age*(self.age-self._a_half)))
+            weight_part = 1/(1+math.exp(-self._phi_weight*(self.weight-self._w_half)))
             self.fitness = age_part * weight_part
 
     def want_to_migrate(self):
@@ -135,7 +175,7 @@ class Animal:
         :rtype: bool
         """
         self.fitness_update()
-        p = self.params["mu"]*self.fitness
+        p = self._mu*self.fitness
         if p > random.random() and self.has_moved is False:
             return True
 
@@ -147,8 +187,7 @@ class Animal:
         :return: true criteria is met
         :rtype: bool
         """
-        if self.weight > (self.params["zeta"] *
-                          (self.params["w_birth"] + self.params["sigma_birth"])):
+        if self.weight > self._zeta * (self._w_birth + self._sigma_birth):
             return True
 
     def birth(self, N):
@@ -167,9 +206,9 @@ class Animal:
 
         :return: Animal of same species when criteria are met.
         """
-        baby_weight = random.gauss(self.params["w_birth"], self.params["sigma_birth"])
-        weight_loss = self.params["xi"] * baby_weight
-        p = min(1, self.params["gamma"] * self.fitness * (N-1))
+        baby_weight = random.gauss(self._w_birth, self._sigma_birth)
+        weight_loss = self._xi * baby_weight
+        p = min(1, self._gamma * self.fitness * (N-1))
         if self.weight > weight_loss and p > random.random() and self.able_to_give_birth():
             self.weight -= weight_loss
             self.fitness_update()
@@ -186,7 +225,7 @@ class Animal:
 
         :return: True if criteria are met
         """
-        if self.weight <= 0 or self.params["omega"]*(1-self.fitness) > random.random():
+        if self.weight <= 0 or self._omega*(1-self.fitness) > random.random():
             return True
 
     def reset_amount(self):
@@ -195,7 +234,6 @@ class Animal:
         """
         self.has_moved = False
         self.amount_eaten = 0
-        self.hungry = True
 
 
 class Herbivore(Animal):
@@ -203,6 +241,7 @@ class Herbivore(Animal):
     This class creates Herbivore instances. These instances represent animals that can live on the
     island in simulations. This class inherits from the Animal class.
     """
+    __slots__ = ()
     params = {"eta": 0.05,
               "beta": 0.9,
               "phi_age": 0.6,
@@ -234,6 +273,7 @@ class Carnivore(Animal):
     This class creates Carnivore instances. These instances represent animals that can live on the
     island in simulations. This class inherits from the Animal class
     """
+    __slots__ = ()
     params = {"eta": 0.125,
                    "beta": 0.75,
                    "phi_age": 0.3,
@@ -259,7 +299,6 @@ class Carnivore(Animal):
         """
         super().__init__(age, weight)
         self.fitness = self.fitness_update()
-        self.hungry = True
         self.amount_eaten = 0
 
     def kill_proba(self, herb):
@@ -287,8 +326,8 @@ class Carnivore(Animal):
         """
         if self.fitness <= herb.fitness:
             kill_proba = 0
-        elif 0 < (self.fitness - herb.fitness) < self.params["DeltaPhiMax"]:
-            kill_proba = (self.fitness - herb.fitness)/self.params["DeltaPhiMax"]
+        elif 0 < (self.fitness - herb.fitness) < self._DeltaPhiMax:
+            kill_proba = (self.fitness - herb.fitness)/self._DeltaPhiMax
         else:
             kill_proba = 1
 
@@ -307,10 +346,10 @@ class Carnivore(Animal):
 
         :return: True is criteria are met.
         """
+        F = self._F
         if self.kill_proba(herbi) and self.hungry:
-            if (self.amount_eaten + herbi.weight) > 50:
-                self.feed(50-self.amount_eaten)
-                self.hungry = False
+            if (self.amount_eaten + herbi.weight) > F:
+                self.feed(F-self.amount_eaten)
             else:
                 self.feed(herbi.weight)
             return True
@@ -4,62 +4,89 @@ __email__ = 'hermane@nmbu.no, ole.gilje.gunnarshaug@nmbu.no'
 """The cell module"""
 
 from .animal import Herbivore, Carnivore
+from . import _kernels
 import random
+import numpy as np
 
+landtype_ids = {"W": 0, "D": 1, "H": 2, "L": 3}
+f_max_table = np.zeros(len(landtype_ids))
 
-class Lowland:
+
+class Landscape:
     """
-    Class that will provide attributes to cell class
+    Base class that will provide attributes to cell class. The maximum amount of fodder of
+    each landscape type is also kept in "f_max_table", indexed by the landtype id, so cells
+    can look it up without comparing strings.
     """
-    f_max = 800
+    landtype = None
+    f_max = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        f_max_table[landtype_ids[cls.landtype]] = cls.f_max
+
     @classmethod
     def set_attr(cls, dicto):
         setattr(cls, "f_max", dicto["f_max"])
+        f_max_table[landtype_ids[cls.landtype]] = cls.f_max
 
 
-class Highland:
+class Lowland(Landscape):
     """
     Class that will provide attributes to cell class
     """
+    landtype = "L"
+    f_max = 800
+
+
+class Highland(Landscape):
+    """
+    Class that will provide attributes to cell class
+    """
+    landtype = "H"
     f_max = 300
-    @classmethod
-    def set_attr(cls, dicto):
-        setattr(cls, "f_max", dicto["f_max"])
 
 
-class Desert:
+class Desert(Landscape):
     """
     Class that will provide attributes to cell class
     """
+    landtype = "D"
     f_max = 0
 
-    @classmethod
-    def set_attr(cls, dicto):
-        setattr(cls, "f_max", dicto["f_max"])
-
 
-class Water:
+class Water(Landscape):
     """
     Class that will provide attributes to cell class
     """
+    landtype = "W"
     f_max = 0
 
-    @classmethod
-    def set_attr(cls, dicto):
-        setattr(cls, "f_max", dicto["f_max"])
 
+class Cell:
+    """
+    Cell class.
 
-fmax_dicto = {"H": Highland.f_max,
-              "L": Lowland.f_max,
-              "W": Water.f_max,
-              "D": Desert.f_max}
+    The animals in a cell are stored as a Structure-of-Arrays: for each species the cell
+    holds one NumPy array per attribute (age, weight, fitness, has_moved and amount eaten),
+    e.g. ``herb_age`` and ``carn_weight``. Row ``i`` in each array of a species describes the
+    same animal, so annual updates can be done as vectorized operations on whole arrays.
 
+    Fitness is not recomputed every time an age or weight changes. Instead the animals whose
+    age or weight has changed are marked in ``fitness_dirty``, and each phase that depends on
+    fitness (eating, procreation, migration and death) recomputes it for the marked animals
+    only, before it starts.
 
-class Cell:
+    The dtype of each array is given in ``animal_dtypes``. Single precision is plenty for
+    weights and fitness, and halves the memory the annual updates have to read and write.
     """
-    Cell class
-    """
-    def __init__(self, landtype, location, animals=[]):
+    animal_attributes = ("age", "weight", "fitness", "fitness_dirty", "has_moved", "eaten")
+    animal_dtypes = {"age": np.int16, "weight": np.float32, "fitness": np.float32,
+                     "fitness_dirty": np.bool_, "has_moved": np.bool_, "eaten": np.float32}
+    species_prefix = {Herbivore: "herb", Carnivore: "carn"}
+    neighbour_offsets = np.array([[-1, 0], [1, 0], [0, -1], [0, 1]])
+
+    def __init__(self, landtype, location, animals=None, rng=None, fodder=None):
         """
         This initializes a cell instance.
 
@@ -73,25 +100,42 @@ class Cell:
         :type habitable: bool
         :param f_max: Maximum amount of fodder in the cell
         :type: f_max: int
+        :param rng: Random number generator of the cell
+        :type rng: numpy.random.Generator
+        :param fodder: Fodder of all cells on the island, indexed by (row, column). The cell
+            keeps its fodder in this array at its own location. If None, the cell gets its own
+            array.
+        :type fodder: numpy array
         """
         self.landtype = landtype
-        self.animals = animals
-        self.herbivore = []
-        self.carnivore = []
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.animals = animals if animals is not None else []
         self.location = location
+        for prefix in self.species_prefix.values():
+            for column, dtype in self.animal_dtypes.items():
+                setattr(self, f"{prefix}_{column}", np.empty(0, dtype=dtype))
+
+        self.landtype_id = landtype_ids[landtype]
+        if fodder is None:
+            self._fodder_store = np.zeros((1, 1))
+            self._fodder_index = (0, 0)
+        else:
+            self._fodder_store = fodder
+            self._fodder_index = (location[1], location[0])
+        self.fodder = f_max_table[self.landtype_id]
+        self.habitable = landtype != "W"
 
-        if self.landtype == "L":
-            self.fodder = fmax_dicto["L"]
-            self.habitable = True
-        elif self.landtype == "H":
-            self.fodder = fmax_dicto["H"]
-            self.habitable = True
-        elif self.landtype == "D":
-            self.fodder = fmax_dicto["D"]
-            self.habitable = True
-        elif self.landtype == "W":
-            self.fodder = fmax_dicto["W"]
-            self.habitable = False
+    @property
+    def fodder(self):
+        """
+        :return: Amount of fodder left in the cell
+        :rtype: float
+        """
+        return self._fodder_store[self._fodder_index]
+
+    @fodder.setter
+    def fodder(self, value):
+        self._fodder_store[self._fodder_index] = value
 
     @property
     def number_of_herbivores(self):
@@ -99,7 +143,7 @@ class Cell:
         :return: number of herbivores in cell.
         :rtype: int
         """
-        return len(self.herbivore)
+        return len(self.herb_weight)
 
     @property
     def number_of_carnivores(self):
@@ -107,68 +151,124 @@ class Cell:
         :return: number of carnivores in cell.
         :rtype: int
         """
-        return len(self.carnivore)
+        return len(self.carn_weight)
 
-    def update_fodder_year(self):
+    def get_columns(self, species):
         """
-        Function updates fodder in cell depending on type of land
+        Returns the arrays describing all animals of a species in the cell.
+
+        :param species: Herbivore or Carnivore
+        :type species: class
+        :return: Dictionary where keys are the names in "animal_attributes" and values are arrays
+        :rtype: dict
         """
-        if self.landtype == "L":
-            self.fodder = 800
-        elif self.landtype == "H":
-            self.fodder = 300
+        prefix = self.species_prefix[species]
+        return {column: getattr(self, f"{prefix}_{column}") for column in self.animal_attributes}
 
-    def animals_to_migrate(self, population):
+    def keep_rows(self, species, rows):
         """
-        :param population: list of animals in one species
-        :type population: list
-        :return: Animals that want to migrate, and animals that want to stay
-        :rtype: list
+        Keeps only the given rows of the arrays of a species, in the given order.
+
+        :param species: Herbivore or Carnivore
+        :type species: class
+        :param rows: Boolean mask or integer indices of the animals to keep
+        :type rows: numpy array or list
         """
-        migrate = []
-        stay = []
-        for x in population:
-            if x.want_to_migrate() and not x.has_moved:
-                x.has_moved = True
-                migrate.append(x)
-            else:
-                stay.append(x)
-        return migrate, stay
+        prefix = self.species_prefix[species]
+        for column in self.animal_attributes:
+            name = f"{prefix}_{column}"
+            setattr(self, name, getattr(self, name)[rows])
 
-    def divide_population(self, list_of_animals):
+    def extend_rows(self, species, new_rows):
         """
-        Function divides species by doing:
+        Appends animals to the arrays of a species.
 
-        1. First, a function that will return animal from a given species in a population
-        is created.
+        :param species: Herbivore or Carnivore
+        :type species: class
+        :param new_rows: Dictionary with one array for each name in "animal_attributes"
+        :type new_rows: dict
+        """
+        prefix = self.species_prefix[species]
+        for column in self.animal_attributes:
+            name = f"{prefix}_{column}"
+            setattr(self, name, np.concatenate((getattr(self, name), new_rows[column])))
 
-        2. Then this function is used to extract the different species into their own list.
+    def add_animals(self, species, age, weight):
+        """
+        Adds new animals of a species to the cell. Their fitness is calculated from the
+        given age and weight.
 
-        :param list_of_animals: List of animals in the cell.
-        :type list_of_animals: list
+        :param species: Herbivore or Carnivore
+        :type species: class
+        :param age: Ages of the new animals
+        :type age: list or numpy array
+        :param weight: Weights of the new animals
+        :type weight: list or numpy array
         """
-        def extract_species(population, species):
-            return [animal for animal in population if type(animal).__name__ == species.__name__]
-        self.herbivore.extend(extract_species(list_of_animals, Herbivore))
-        self.carnivore.extend(extract_species(list_of_animals, Carnivore))
+        age = np.asarray(age, dtype=self.animal_dtypes["age"])
+        weight = np.asarray(weight, dtype=self.animal_dtypes["weight"])
+        n = len(age)
+        self.extend_rows(species, {"age": age,
+                                   "weight": weight,
+                                   "fitness": species.fitness_array(age, weight).astype(
+                                       self.animal_dtypes["fitness"]),
+                                   "fitness_dirty": np.zeros(n, dtype=np.bool_),
+                                   "has_moved": np.zeros(n, dtype=np.bool_),
+                                   "eaten": np.zeros(n, dtype=self.animal_dtypes["eaten"])})
+
+    def update_fodder_year(self):
+        """
+        Function updates fodder in cell depending on type of land, by looking up the landtype
+        id in "f_max_table".
+        """
+        self.fodder = f_max_table[self.landtype_id]
+
+    def animals_to_migrate(self, species):
+        """
+        Finds the animals of a species that want to migrate, and marks them as moved.
+
+        :param species: Herbivore or Carnivore
+        :type species: class
+        :return: Boolean mask of the animals that want to migrate
+        :rtype: numpy array
+        """
+        self.update_fitness(species)
+        columns = self.get_columns(species)
+        p = species._mu * columns["fitness"]
+        migrate = (p > self.rng.random(len(p))) & ~columns["has_moved"]
+        columns["has_moved"][migrate] = True
+        return migrate
+
+    def divide_population(self, herbivores, carnivores):
+        """
+        Function adds the ages and weights of the given herbivores and carnivores to the arrays
+        of the cell. The animals are given in one list per species, so no type checks are needed.
+
+        :param herbivores: List of herbivores to add to the cell.
+        :type herbivores: list
+        :param carnivores: List of carnivores to add to the cell.
+        :type carnivores: list
+        """
+        for species, animals in ((Herbivore, herbivores), (Carnivore, carnivores)):
+            self.add_animals(species,
+                             [animal.age for animal in animals],
+                             [animal.weight for animal in animals])
 
     @staticmethod
-    def migrate(animal, destination, cells):
+    def migrate(species, animal, destination, cells):
         """
         This function moves animals to their destination cell.
 
-        :param animal: Class instance of a given species
-        :type animal: Class instance
+        :param species: Herbivore or Carnivore
+        :type species: class
+        :param animal: Dictionary with the arrays describing the migrating animals
+        :type animal: dict
         :param destination: Tuple with the coordinates of the cell the animals migrate to
         :type destination: tuple
         :param cells: Dictionary containing the different cells on the island
         :type cells: dict
-
         """
-        if type(animal) is Herbivore:
-            cells[destination].herbivore.append(animal)
-        elif type(animal) is Carnivore:
-            cells[destination].carnivore.append(animal)
+        cells[destination].extend_rows(species, animal)
 
     @staticmethod
     def get_target_destination(cell_coord):
@@ -187,12 +287,18 @@ class Cell:
 
     def update_fitness(self, species):
         """
-        This list iterates through every animal in given species list and updates their fitness
+        This function updates the fitness of the animals of the given species whose age or
+        weight has changed since their fitness was last calculated.
 
-        :param species: List of all the animals of a species in the given cell.
-        :type species: list
+        :param species: Herbivore or Carnivore
+        :type species: class
         """
-        [ani.fitness_update() for ani in species]
+        columns = self.get_columns(species)
+        dirty = columns["fitness_dirty"]
+        if dirty.any():
+            columns["fitness"][dirty] = species.fitness_array(columns["age"][dirty],
+                                                              columns["weight"][dirty])
+            dirty[:] = False
 
     def herbivores_eat(self):
         """
@@ -200,87 +306,109 @@ class Cell:
 
         1. First, it updates the fitness for all herbivores.
 
-        2. Then it sorts the list of herbivores in regard to their fitness. To make sure the
-            fittest eat first.
-
-        3. Then it iterates through all the herbivores. If available fodder, it will eat according
-            to their F value. If fodder below this, it will eat what is left, if anything.
+        2. Then the herbivores eat according to their F value, the fittest first, as long as
+            there is fodder left. This is done in a compiled kernel, see
+            :func:`biosim._kernels.herbivores_eat`.
         """
-        self.update_fitness(self.herbivore)
-        self.herbivore.sort(key=lambda x: x.fitness, reverse=True)
-        for herb in self.herbivore:
-            if self.fodder >= herb.params["F"]:
-                herb.feed(herb.params["F"])
-                self.fodder -= herb.params["F"]
-            else:
-                amount_left = self.fodder
-                herb.feed(amount_left)
-                self.fodder = 0
+        self.update_fitness(Herbivore)
+        self.fodder = _kernels.herbivores_eat(self.herb_fitness, self.herb_weight,
+                                              self.herb_eaten, self.herb_fitness_dirty,
+                                              self.fodder, Herbivore._F, Herbivore._beta)
 
     def carnivores_eat(self):
         """
         This function is so that carnivores eat.
 
-        1. First, we update the fitness for the carnivores, to make sure it updates ######
-
-        2. Then we sort the herbivores' fitness in ascending order, so that it will start
-            with the weakest first.
-
-        3. Then we will go through every carnivore in self.carnivore. Then we will check how
-        much it will eat, and update self.herbivore to only contain the survivors.
-        """
-        self.update_fitness(self.carnivore)
-        self.update_fitness(self.herbivore)
-        self.herbivore.sort(key=lambda x: x.fitness)
-        for carni in self.carnivore:
-            self.herbivore = [herb for herb in self.herbivore if not carni.kill(herb)]
-
-    def create_newborns(self, species_pop):
-        """
-        This function returns newborn to add in species list. Newborn is created if animal.birth
-        results in new class instance of the species.
-
-        :param species_pop: List of all the animals in a given species
-        :type species_pop: list
-        :return: Newborn to add in species list
-        :rtype: list
-        """
-        N = len(species_pop)
-        return [newborn for animal in species_pop if (newborn := animal.birth(N))]
+        1. First, we update the fitness for the carnivores and herbivores.
+
+        2. Then we sort the herbivores' arrays by fitness in ascending order, so that it will
+            start with the weakest first.
+
+        3. Then we will go through every carnivore. It tries to kill the herbivores that are
+        still alive, one at the time, as long as it is hungry. Lastly only the survivors are
+        kept.
+        """
+        self.update_fitness(Carnivore)
+        self.update_fitness(Herbivore)
+        self.keep_rows(Herbivore, np.argsort(self.herb_fitness))
+        survivors = _kernels.carnivores_eat(self.rng, self.carn_age, self.carn_fitness,
+                                            self.carn_weight, self.carn_eaten, self.herb_fitness,
+                                            self.herb_weight, Carnivore._DeltaPhiMax,
+                                            Carnivore._beta, Carnivore._F, Carnivore._phi_age,
+                                            Carnivore._a_half, Carnivore._phi_weight,
+                                            Carnivore._w_half)
+        self.keep_rows(Herbivore, survivors)
+
+    def create_newborns(self, species):
+        """
+        This function makes the animals of a species give birth. The probability of giving
+        birth, and the weight loss of the mother, is described in :meth:`Animal.birth`. The
+        uniform numbers for all animals are drawn at once. Newborn weights are then drawn only
+        for the animals that pass the random draw and are heavy enough. Those animals give
+        birth if they weigh more than their weight loss.
+
+        :param species: Herbivore or Carnivore
+        :type species: class
+        :return: Weights of the newborns
+        :rtype: numpy array
+        """
+        columns = self.get_columns(species)
+        weight = columns["weight"]
+        n = len(weight)
+        p = np.minimum(1, species._gamma * columns["fitness"] * (n - 1))
+        min_weight = species._zeta * (species._w_birth + species._sigma_birth)
+        candidates = np.flatnonzero((weight > min_weight) & (p > self.rng.random(n)))
+        baby_weight = self.rng.normal(species._w_birth, species._sigma_birth, len(candidates))
+        weight_loss = species._xi * baby_weight
+        gives_birth = weight[candidates] > weight_loss
+        mothers = candidates[gives_birth]
+        weight[mothers] -= weight_loss[gives_birth]
+        columns["fitness_dirty"][mothers] = True
+        return baby_weight[gives_birth]
 
     def add_newborns(self):
         """
-        This function extends population lists with newborns.
+        This function extends the population arrays with newborns.
         """
-        self.update_fitness(self.herbivore)
-        self.update_fitness(self.carnivore)
-        self.herbivore.extend(self.create_newborns(self.herbivore))
-        self.carnivore.extend(self.create_newborns(self.carnivore))
+        for species in (Herbivore, Carnivore):
+            self.update_fitness(species)
+            newborns = self.create_newborns(species)
+            self.add_animals(species, np.zeros(len(newborns)), newborns)
 
     def updating_age_for_entire_population(self):
         """
         This function updates annual age for all animals in a cell, regardless of species.
         """
-        [animal.age_update() for animal in self.herbivore + self.carnivore]
+        self.herb_age += 1
+        self.carn_age += 1
+        self.herb_fitness_dirty[:] = True
+        self.carn_fitness_dirty[:] = True
 
     def updating_weight_loss_for_entire_population(self):
         """
         This function updates annual weight loss for all animals in a cell, regardless of species.
         """
-        [animal.annual_weight_loss() for animal in self.herbivore + self.carnivore]
+        self.herb_weight *= 1 - Herbivore._eta
+        self.carn_weight *= 1 - Carnivore._eta
+        self.herb_fitness_dirty[:] = True
+        self.carn_fitness_dirty[:] = True
 
     def check_for_random_death(self):
         """
-        This function checks if animals dies. Updates list to only contain survivors.
+        This function checks if animals dies. Updates arrays to only contain survivors.
         """
-        self.herbivore = [herb for herb in self.herbivore if not herb.animal_dies()]
-        self.carnivore = [carn for carn in self.carnivore if not carn.animal_dies()]
+        for species in (Herbivore, Carnivore):
+            self.update_fitness(species)
+            columns = self.get_columns(species)
+            p = species._omega * (1 - columns["fitness"])
+            dies = (p > self.rng.random(len(p))) | (columns["weight"] <= 0)
+            self.keep_rows(species, ~dies)
 
     def reset_attributes(self):
         """
-        This function resets alle the attributes listed in "reset_amount()" for all animals in
-        given cell.
+        This function resets has_moved and amount eaten for all animals in given cell.
         """
-        [i.reset_amount() for i in self.carnivore + self.herbivore]
-
-
+        self.herb_has_moved[:] = False
+        self.carn_has_moved[:] = False
+        self.herb_eaten[:] = 0
+        self.carn_eaten[:] = 0
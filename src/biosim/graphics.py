@@ -6,6 +6,9 @@ File is based on code found in the "randvis" project by Hans Ekkard Plesser
 """
 
 import matplotlib.pyplot as plt
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import Normalize
+from matplotlib.collections import LineCollection
 import numpy as np
 import subprocess
 import os
@@ -19,10 +22,19 @@ _DEFAULT_GRAPHICS_NAME = 'dv'
 _DEFAULT_IMG_FORMAT = 'png'
 _DEFAULT_MOVIE_FORMAT = 'mp4'
 
+# Translates landscape letters to row numbers in _LAND_RGB
+_LAND_CODES = str.maketrans({'W': '\x00', 'L': '\x01', 'H': '\x02', 'D': '\x03'})
+#                         R    G    B
+_LAND_RGB = np.array([[0.0, 0.0, 1.0],   # Water: blue
+                      [0.0, 0.6, 0.0],   # Lowland: dark green
+                      [0.5, 1.0, 0.5],   # Highland: light green
+                      [1.0, 1.0, 0.5]])  # Desert: light yellow
+
 class Graphics:
     """Provides graphics support for Biosim."""
     def __init__(self, hist_specs, img_fmt=None, ymax_animals=None,
-                 cmax_animals=None, img_years=None, img_dir=None, img_base=None):
+                 cmax_animals=None, img_years=None, img_dir=None, img_base=None,
+                 stream_movie=False):
         """
         :param hist_specs: dictionary of histograms specifications
         :type hist_specs: dict
@@ -41,6 +53,10 @@ class Graphics:
         :type img_dir: str
         :param img_base: String with beginning of file name for figures
         :type img_base: str
+        :param stream_movie: If True, the saved frames are piped directly to ffmpeg as raw
+            pixels, and :meth:`make_movie` only finishes the MPEG4 movie. No image files are
+            written.
+        :type stream_movie: bool
         """
         if img_dir is None:
             self._img_dir = _DEFAULT_GRAPHICS_DIR
@@ -51,22 +67,36 @@ class Graphics:
         else:
             self._img_base = img_base
         self._img_fmt = img_fmt if img_fmt is not None else _DEFAULT_IMG_FORMAT
-        if hist_specs is None:
-            self._hist_specs = {"fitness": {"max": 1.0, "delta": 0.1},
-                                "age": {"max": 40.0, "delta": 2.0},
-                                "weight": {"max": 40.0, "delta": 2.0}}
-        else:
-            self._hist_specs = hist_specs
+        self._img_path_template = f'{self._img_base}_{{:05d}}.{self._img_fmt}'
+        self._hist_specs = {"fitness": {"max": 1.0, "delta": 0.1},
+                            "age": {"max": 40.0, "delta": 2.0},
+                            "weight": {"max": 40.0, "delta": 2.0}}
+        if hist_specs is not None:
+            self._hist_specs.update(hist_specs)
+        self._nbins = {stat: int(spec['max'] / spec['delta'])
+                       for stat, spec in self._hist_specs.items()}
+        self._hist_edges = {stat: np.linspace(0, spec['max'], self._nbins[stat] + 1)
+                            for stat, spec in self._hist_specs.items()}
 
         self._cmax_animals = cmax_animals if cmax_animals is not None else {"Herbivore": 50,
                                                                             "Carnivore": 20}
         self._ymax_animals = ymax_animals
+        self._herb_norm = Normalize(0, self._cmax_animals["Herbivore"])
+        self._carn_norm = Normalize(0, self._cmax_animals["Carnivore"])
+        self._herb_cmap = plt.get_cmap('Greens')
+        self._carn_cmap = plt.get_cmap('Reds')
+        # RGBA colors of the colormaps, so counts can be colored with one lookup
+        self._herb_lut = self._herb_cmap(np.linspace(0, 1, self._herb_cmap.N), bytes=True)
+        self._carn_lut = self._carn_cmap(np.linspace(0, 1, self._carn_cmap.N), bytes=True)
         self._img_years = img_years if img_years is not None else 1
         self._img_ctr = 0
         self._img_step = 1
+        self._stream_movie = stream_movie
+        self._movie_process = None
         self._template = '{:5d}'
 
         self._fig = None
+        self._live_display = False
         self._map_of_island_ax = None
         self._yearcount_ax = None
         self._animal_line_count_ax = None
@@ -78,7 +108,19 @@ class Graphics:
         self._hist_weight_ax = None
         self._migration_herb_ax = None
         self._migration_carn_ax = None
-
+        self._plt_fig_title = None
+        self._animal_legend = None
+        self._colorbar_herb = None
+        self._colorbar_carn = None
+        self._img_herb_axis = None
+        self._img_carn_axis = None
+        self._herb_rgba = None
+        self._carn_rgba = None
+        self._line_x = None
+        self._herb_y = None
+        self._carn_y = None
+        self._hist_lines = {}
+        self._background = None
 
     def get_bins(self, stat):
         """
@@ -87,7 +129,7 @@ class Graphics:
         :return: number of bins
         :rtype: int
         """
-        return int(self._hist_specs[stat]['max'] / self._hist_specs[stat]['delta'])
+        return self._nbins[stat]
 
     def setup(self, final_step, island_map):
         """
@@ -103,6 +145,11 @@ class Graphics:
 
         if self._fig is None:
             self._fig = plt.figure()
+            self._fig.canvas.mpl_connect('draw_event', self._on_draw)
+            # Only canvases of GUI backends need to be shown and have events processed
+            self._live_display = self._fig.canvas.required_interactive_framework is not None
+            if self._live_display:
+                self._fig.show()
 
         if self._map_of_island_ax is None:
             self._map_of_island_ax = self._fig.add_axes([0.07, 0.60, 0.25, 0.25])
@@ -118,7 +165,8 @@ class Graphics:
                                                       fontsize=15,
                                                       horizontalalignment='center',
                                                       verticalalignment='center',
-                                                      transform=self._yearcount_ax.transAxes)
+                                                      transform=self._yearcount_ax.transAxes,
+                                                      animated=True)
 
 
         if self._animal_line_count_ax is None:
@@ -127,76 +175,157 @@ class Graphics:
 
             if self._animal_line_count_ax is not None:
                 self._animal_line_count_ax.set_ylim(0, self._ymax_animals)
-            self._animal_line_count_ax.set_xlim(0, 300)
 
 
         if self._hist_fitness_ax is None:
             self._hist_fitness_ax = self._fig.add_axes([0.10, 0.05, 0.20, 0.1])
             self._hist_fitness_ax.set_title('Fitness')
+            self._setup_histogram('fitness', self._hist_fitness_ax)
 
         if self._hist_age_ax is None:
             self._hist_age_ax = self._fig.add_axes([0.40, 0.05, 0.20, 0.1])
             self._hist_age_ax.set_title('Age')
+            self._setup_histogram('age', self._hist_age_ax)
 
         if self._hist_weight_ax is None:
             self._hist_weight_ax = self._fig.add_axes([0.75, 0.05, 0.20, 0.1])
             self._hist_weight_ax.set_title('Weight')
+            self._setup_histogram('weight', self._hist_weight_ax)
 
         if self._migration_herb_ax is None:
             self._migration_herb_ax = self._fig.add_axes([0.10, 0.25, 0.22, 0.22])
             self._migration_herb_ax.axis('off')
             self._migration_herb_ax.set_title("Herbivore Density")
-            self._img_herb_axis = None
 
         if self._migration_carn_ax is None:
             self._migration_carn_ax = self._fig.add_axes([0.68, 0.25, 0.22, 0.22])
             self._migration_carn_ax.axis('off')
             self._migration_carn_ax.set_title("Carnivore Density")
-            self._img_carn_axis = None
 
+        # The density maps are colored into these buffers each year, see _color_counts()
+        if self._herb_rgba is None:
+            lines = island_map.split()
+            self._herb_rgba = np.empty((len(lines), len(lines[0]), 4), dtype=np.uint8)
+            self._carn_rgba = np.empty_like(self._herb_rgba)
+
+        # The counts of each year are stored in preallocated buffers that are given to the lines.
+        # When the final step grows, the buffers are extended with NaN for the new years.
+        if self._line_x is None:
+            self._line_x = np.arange(final_step + 1)
+            self._herb_y = np.full(final_step + 1, np.nan)
+            self._carn_y = np.full(final_step + 1, np.nan)
+        elif final_step + 1 > len(self._line_x):
+            new_years = np.full(final_step + 1 - len(self._line_x), np.nan)
+            self._line_x = np.arange(final_step + 1)
+            self._herb_y = np.concatenate((self._herb_y, new_years))
+            self._carn_y = np.concatenate((self._carn_y, new_years))
+
+        self._animal_line_count_ax.set_xlim(0, final_step)
 
         if self._herbivore_line is None:
-            herbivore_line_plot = self._animal_line_count_ax.plot(np.arange(0, final_step + 1),
-                                                                  np.full(final_step + 1, np.nan),
-                                                                  'g-')
-            self._herbivore_line = herbivore_line_plot[0]
+            self._herbivore_line = self._animal_line_count_ax.plot(self._line_x, self._herb_y,
+                                                                   'g-', animated=True)[0]
         else:
-            x_data_herb, y_data_herb = self._herbivore_line.get_data()
-            x_new_herb = np.arange(x_data_herb[-1] + 1, final_step + 1)
-            if len(x_new_herb) > 0:
-                y_new_herb = np.full(x_new_herb.shape, np.nan)
-                self._herbivore_line.set_data(np.hstack((x_data_herb, x_new_herb),
-                                                        (y_data_herb, y_new_herb)))
+            self._herbivore_line.set_data(self._line_x, self._herb_y)
 
         # Setup for carnivore line
         if self._carnivore_line is None:
-            carnivore_line_plot = self._animal_line_count_ax.plot(np.arange(0, final_step + 1),
-                                                                  np.full(final_step + 1, np.nan),
-                                                                  'r-')
-            self._carnivore_line = carnivore_line_plot[0]
+            self._carnivore_line = self._animal_line_count_ax.plot(self._line_x, self._carn_y,
+                                                                   'r-', animated=True)[0]
         else:
-            x_data_carn, y_data_carn = self._carnivore_line.get_data()
-            x_new_carn = np.arange(x_data_carn[-1] + 1, final_step + 1)
-            if len(x_new_carn) > 0:
-                y_new_carn = np.full(x_new_carn.shape, np.nan)
-                self._carnivore_line.set_data(np.hstack((x_data_carn, x_new_carn),
-                                                        (y_data_carn, y_new_carn)))
+            self._carnivore_line.set_data(self._line_x, self._carn_y)
 
         # Legend:
-        self._animal_line_count_ax.legend([self._herbivore_line, self._carnivore_line],
-                                          ["Herbivore", "Carnivore"],
-                                          fontsize=8)
-
-        self._plt_fig_title = self._fig.add_axes([0.28, 0.85, 0.5, 0.2])  # llx, lly, w, h
-        self._plt_fig_title.axis('off')
-        self._plt_fig_title_txt = self._plt_fig_title.text(0.5, 0.5, self._template.format(0),
-                                                           horizontalalignment='center',
-                                                           verticalalignment='center',
-                                                           transform=self._plt_fig_title.transAxes,
-                                                           fontsize=8,
-                                                           fontweight='bold')
-        self._plt_fig_title_txt.set_text("BioSim June 2022 Group 19"
-                                         "\n Herman Ellingsen and Ole Gilje Gunnarshaug")
+        if self._animal_legend is None:
+            self._animal_legend = self._animal_line_count_ax.legend(
+                [self._herbivore_line, self._carnivore_line], ["Herbivore", "Carnivore"],
+                fontsize=8)
+
+        if self._plt_fig_title is None:
+            self._plt_fig_title = self._fig.add_axes([0.28, 0.85, 0.5, 0.2])  # llx, lly, w, h
+            self._plt_fig_title.axis('off')
+            self._plt_fig_title_txt = self._plt_fig_title.text(
+                0.5, 0.5, "BioSim June 2022 Group 19"
+                          "\n Herman Ellingsen and Ole Gilje Gunnarshaug",
+                horizontalalignment='center', verticalalignment='center',
+                transform=self._plt_fig_title.transAxes, fontsize=8, fontweight='bold')
+        self._background = None
+
+    def _setup_histogram(self, stat, ax):
+        """
+        Creates the step lines of a histogram once, with all counts set to zero. Both species
+        are drawn by one LineCollection, with one colored step line per species. The counts are
+        updated with :meth:`_update_histogram`.
+
+        :param stat: age, weight or fitness
+        :type stat: str
+        :param ax: axis of the histogram
+        :type ax: matplotlib.axes.Axes
+        """
+        empty = self._step_line(self._hist_edges[stat], np.zeros(self._nbins[stat]))
+        self._hist_lines[stat] = ax.add_collection(LineCollection([empty, empty],
+                                                                  colors=('g', 'r'), lw=2,
+                                                                  animated=True),
+                                                   autolim=False)
+        ax.set_xlim(0, self._hist_specs[stat]['max'])
+        ax.set_ylim(0, 1)
+
+    @staticmethod
+    def _step_line(edges, counts):
+        """
+        :param edges: bin edges of a histogram
+        :type edges: numpy array
+        :param counts: counts of each bin
+        :type counts: numpy array
+        :return: Vertices of the outline of the histogram, starting and ending at zero
+        :rtype: numpy array
+        """
+        return np.column_stack((np.repeat(edges, 2), np.concatenate(([0], np.repeat(counts, 2),
+                                                                     [0]))))
+
+    def _animated_artists(self):
+        """
+        :return: The artists that change every year, and are drawn on top of the background
+        :rtype: list
+        """
+        artists = [self._year_text, self._herbivore_line, self._carnivore_line]
+        artists += [image for image in (self._img_herb_axis, self._img_carn_axis)
+                    if image is not None]
+        artists += self._hist_lines.values()
+        return artists
+
+    def _on_draw(self, event):
+        """
+        Called after every full draw of the figure. Stores the background, which holds
+        everything but the animated artists, and draws the animated artists on top of it.
+
+        :param event: draw event from the canvas
+        :type event: matplotlib.backend_bases.DrawEvent
+        """
+        canvas = self._fig.canvas
+        if canvas.is_saving():
+            return
+        self._background = canvas.copy_from_bbox(self._fig.bbox)
+        for artist in self._animated_artists():
+            self._fig.draw_artist(artist)
+
+    def _blit(self):
+        """
+        Redraws the animated artists on top of the stored background. If the background is
+        missing or outdated, e.g. when an axis limit changed, a full redraw is requested with
+        draw_idle instead, so that several requests are drawn only once by the GUI. The
+        animated artists are then drawn by :meth:`_on_draw`.
+        """
+        canvas = self._fig.canvas
+        if self._background is None:
+            canvas.draw_idle()
+        else:
+            canvas.restore_region(self._background)
+            for artist in self._animated_artists():
+                self._fig.draw_artist(artist)
+            canvas.blit(self._fig.bbox)
+        if self._live_display:
+            canvas.flush_events()
 
     def update(self, year, total_herbivores, total_carnivores,
                map_herbs, map_carns, dicto_hist_herb, dicto_hist_can):
@@ -207,9 +336,11 @@ class Graphics:
         :type total_herbivores: int
         :param total_carnivores: amount of carnivores on island
         :type total_carnivores: int
-        :param map_herbs: numpy array showing how many herbivore are in each cell
+        :param map_herbs: numpy array showing how many herbivore are in each cell, indexed by
+            (row, column)
         :type map_herbs: numpy array
-        :param map_carns: numpy array showing how many carnivore are in each cell
+        :param map_carns: numpy array showing how many carnivore are in each cell, indexed by
+            (row, column)
         :type map_carn: numpy array
         :param dicto_hist_herb: dictionary containing information for histograms for herbivores
         :type dicto_hist_herb: dict
@@ -217,69 +348,46 @@ class Graphics:
         :type dicto_hist_carn: dict
         """
         self._update_year_count(year)
-        self._update_total_animals(year, total_herbivores, total_carnivores)
+        self.record_totals(year, total_herbivores, total_carnivores)
+        self._update_total_animals()
         self._update_system_map(map_herbs, map_carns)
-        self._fig.canvas.flush_events()
-        self._update_age_ax(dicto_hist_herb["age"], dicto_hist_can["age"])
-        self._update_weight_ax(dicto_hist_herb["weight"], dicto_hist_can["weight"])
-        self._update_fitness_ax(dicto_hist_herb["fitness"], dicto_hist_can["fitness"])
-        plt.pause(1e-6)  # 1e-6
+        for stat in ("age", "weight", "fitness"):
+            self._update_histogram(stat, dicto_hist_herb[stat], dicto_hist_can[stat])
+        self._blit()
 
         if year % self._img_years == 0:
             self._save_graphics(year)
 
 
-    def _update_age_ax(self, herb_age, carn_age):
-        """
-        Updates histogram for age
-
-        :param herb_age: list of all herbivore ages
-        :type: herb_age: list
-        :param carn_age: list of all herbivore ages
-        :type: carn_age: list
-        """
-        self._hist_age_ax.clear()
-        self._hist_age_ax.set_title('Age')
-        age_bins = self.get_bins('age')
-        self._hist_age_ax.hist((herb_age, carn_age), bins=age_bins,
-                               range=(0, self._hist_specs['age']['max']),
-                               histtype='step', color=('g', "r"), lw=2)
-
-    def _update_weight_ax(self, herb_weight, carn_weight):
-        """
-        Updates histogram for weight
-
-        :param herb_weight: list of all herbivore weights
-        :tyoe herb_weight: list
-        :param carn_weight: list of all carnivore weight
-        :type carn_weight: list
+    def _update_histogram(self, stat, herb_values, carn_values):
         """
-        self._hist_weight_ax.clear()
-        self._hist_weight_ax.set_title('Weight')
-        weight_bins = self.get_bins('weight')
-        self._hist_weight_ax.hist((herb_weight, carn_weight), bins=weight_bins,
-                                  range=(0, self._hist_specs['weight']['max']),
-                                  histtype='step', color=('g', "r"), lw=2)
-
-    def _update_fitness_ax(self, herb_fitness, carn_fitness):
+        Updates the counts of a histogram. The y-axis is only changed, which needs a full redraw,
+        when the counts no longer fit or have become much smaller than the axis.
+
+        :param stat: age, weight or fitness
+        :type stat: str
+        :param herb_values: values of the stat for all herbivores
+        :type herb_values: list
+        :param carn_values: values of the stat for all carnivores
+        :type carn_values: list
         """
-        Updates histogram for fitness
-
-        :param herb_fitness: list of all herbivore fitnesses
-        :type: herb_fitness: list
-        :param carn_fitness: list of all carnivore fitnesses
-        :type: carn_fitness: list
+        edges = self._hist_edges[stat]
+        herb_counts, _ = np.histogram(herb_values, bins=edges)
+        carn_counts, _ = np.histogram(carn_values, bins=edges)
+        lines = self._hist_lines[stat]
+        lines.set_segments([self._step_line(edges, herb_counts),
+                            self._step_line(edges, carn_counts)])
+        top = max(1, herb_counts.max(), carn_counts.max())
+        ax = lines.axes
+        if not top < ax.get_ylim()[1] <= top * 4:
+            ax.set_ylim(0, top * 1.2)
+            self._background = None
+
+    def record_totals(self, year, herbivores, carnivores):
         """
-        self._hist_fitness_ax.clear()
-        self._hist_fitness_ax.set_title('Fitness')
-        fitness_bins = self.get_bins('fitness')
-        self._hist_fitness_ax.hist((herb_fitness, carn_fitness), bins=fitness_bins,
-                                   range=(0, self._hist_specs['fitness']['max']),
-                                   histtype='step', color=('g', "r"), lw=2)
-
-    def _update_total_animals(self, year, herbivores, carnivores):
-        """
-        Updates line plot for Herbivore and Carnivore
+        Stores the number of animals of a year in the line plot, without redrawing anything.
+        This lets the line plot cover every year, also when the figure is only updated every
+        few years.
 
         :param year: year in plot
         :type year: int
@@ -288,18 +396,24 @@ class Graphics:
         :param carnivores: amount of carnivores in given year
         :type carnivores: int
         """
-        y_data_herb = self._herbivore_line.get_ydata()
-        y_data_herb[year] = herbivores
-        self._herbivore_line.set_ydata(y_data_herb)
+        self._herb_y[year] = herbivores
+        self._carn_y[year] = carnivores
 
-        y_data_carn = self._carnivore_line.get_ydata()
-        y_data_carn[year] = carnivores
-        self._carnivore_line.set_ydata(y_data_carn)
+    def _update_total_animals(self):
+        """
+        Updates line plot for Herbivore and Carnivore with the numbers stored by
+        :meth:`record_totals`.
+        """
+        self._herbivore_line.set_ydata(self._herb_y)
+        self._carnivore_line.set_ydata(self._carn_y)
 
         # Updates y_axis automatically if _ymax_animals is not set
         if self._ymax_animals is None:
-            y_data_herb[0] = 1
-            self._animal_line_count_ax.set_ylim(0, max(y_data_herb)+(max(y_data_herb)*0.20))
+            self._herb_y[0] = 1
+            ylim = np.nanmax(self._herb_y) * 1.2
+            if ylim != self._animal_line_count_ax.get_ylim()[1]:
+                self._animal_line_count_ax.set_ylim(0, ylim)
+                self._background = None
 
     def _update_year_count(self, year):
         """
@@ -312,16 +426,13 @@ class Graphics:
 
     def _plot_island(self):
         """
-        Plots island map in _fig
+        Plots island map in _fig. The letters of the map are translated to row numbers in
+        _LAND_RGB, which gives the colors of all cells with one lookup.
         """
-        #                   R    G    B
-        rgb_value = {'W': (0.0, 0.0, 1.0),  # blue
-                     'L': (0.0, 0.6, 0.0),  # dark green
-                     'H': (0.5, 1.0, 0.5),  # light green
-                     'D': (1.0, 1.0, 0.5)}  # light yellow
-
-        map_rgb = [[rgb_value[column] for column in row] for row in
-                   self._island_map_string.splitlines()]
+        lines = self._island_map_string.split()
+        codes = np.frombuffer(''.join(lines).translate(_LAND_CODES).encode('latin-1'),
+                              dtype=np.uint8)
+        map_rgb = _LAND_RGB[codes].reshape(len(lines), len(lines[0]), 3)
 
         self._map_of_island_ax.imshow(map_rgb)
 
@@ -364,43 +475,69 @@ class Graphics:
                 text_color = 'White'
             ax_map_legend.add_patch(plt.Rectangle((0., ix * 0.2), 1.5, 0.1,
                                           edgecolor='none',
-                                          facecolor=rgb_value[name[0]]))
+                                          facecolor=_LAND_RGB[ix]))
             ax_map_legend.text(0., ix * 0.2, name, transform=ax_map_legend.transAxes,
                        color=text_color, fontsize=7, fontweight='bold')
 
+    @staticmethod
+    def _color_counts(counts, lut, cmax, out):
+        """
+        Colors animal counts like a colormap normalized to [0, cmax] would. The colors are
+        written to a preallocated buffer, so no new image is made each year.
+
+        :param counts: number of animals in each cell
+        :type counts: numpy array
+        :param lut: RGBA colors of the colormap, as uint8
+        :type lut: numpy array
+        :param cmax: count that gets the last color
+        :type cmax: int or float
+        :param out: buffer for the RGBA image, of the shape of counts plus one axis of length 4
+        :type out: numpy array
+        :return: out, the RGBA image of the counts
+        :rtype: numpy array
+        """
+        index = np.clip(counts * (len(lut) / cmax), 0, len(lut) - 1).astype(np.intp)
+        return np.take(lut, index, axis=0, out=out)
+
     def _update_system_map(self, map_herbs, map_carns):
         """
-        Update the 2D-view of the system.
+        Update the 2D-view of the system. The counts are colored here, with the lookup table
+        of each species, so the images are given final RGBA pixels and matplotlib does not
+        have to color them again.
 
-        :param map_herbs: numpy array showing how many herbivore are in each cell
+        :param map_herbs: numpy array showing how many herbivore are in each cell, indexed by
+            (row, column)
         :type map_herbs: numpy array
-        :param map_carns: numpy array showing how many carnivore are in each cell
+        :param map_carns: numpy array showing how many carnivore are in each cell, indexed by
+            (row, column)
         :type map_carns: numpy array
         """
-        map_herb = np.transpose(map_herbs)
+        map_herb = self._color_counts(map_herbs, self._herb_lut, self._cmax_animals["Herbivore"],
+                                       self._herb_rgba)
         if self._img_herb_axis is not None:
             self._img_herb_axis.set_data(map_herb)
         else:
             self._img_herb_axis = self._migration_herb_ax.imshow(map_herb,
                                                                  interpolation='nearest',
-                                                                 vmin=0,
-                                                                 vmax=self._cmax_animals["Herbivore"],
-                                                                 cmap='Greens')
-            plt.colorbar(self._img_herb_axis, ax=self._migration_herb_ax,
-                         orientation='horizontal')
-
-        map_carn = np.transpose(map_carns)
+                                                                 animated=True)
+        if self._colorbar_herb is None:
+            self._colorbar_herb = plt.colorbar(ScalarMappable(self._herb_norm, self._herb_cmap),
+                                               ax=self._migration_herb_ax,
+                                               orientation='horizontal')
+
+        map_carn = self._color_counts(map_carns, self._carn_lut, self._cmax_animals["Carnivore"],
+                                       self._carn_rgba)
         if self._img_carn_axis is not None:
             self._img_carn_axis.set_data(map_carn)
-
         else:
             self._img_carn_axis = self._migration_carn_ax.imshow(map_carn,
                                                                  interpolation='nearest',
-                                                                 vmin=0,
-                                                                 vmax=self._cmax_animals["Carnivore"],
-                                                                 cmap='Reds')
-            plt.colorbar(self._img_carn_axis, ax=self._migration_carn_ax,
-                         orientation='horizontal')
+                                                                 animated=True)
+        if self._colorbar_carn is None:
+            self._colorbar_carn = plt.colorbar(ScalarMappable(self._carn_norm, self._carn_cmap),
+                                               ax=self._migration_carn_ax,
+                                               orientation='horizontal')
+            self._background = None
 
     def _save_graphics(self, step):
         """
@@ -412,9 +549,40 @@ class Graphics:
         if self._img_base is None or step % self._img_step != 0:
             return
 
-        plt.savefig(f'{os.path.join(self._img_base)}_{step:05d}.{self._img_fmt}')
+        if self._stream_movie:
+            self._write_movie_frame()
+        else:
+            plt.savefig(self._img_path_template.format(step))
         self._img_ctr += 1
 
+    def _write_movie_frame(self):
+        """
+        Writes the current pixels of the canvas to ffmpeg. ffmpeg is started on the first frame,
+        and reads raw RGBA frames of the size of the canvas from its stdin.
+        """
+        canvas = self._fig.canvas
+        if self._background is None:
+            canvas.draw()
+        if self._movie_process is None:
+            width, height = canvas.get_width_height(physical=True)
+            try:
+                self._movie_process = subprocess.Popen(
+                    [_FFMPEG_BINARY,
+                     '-f', 'rawvideo',
+                     '-pix_fmt', 'rgba',
+                     '-s', f'{width}x{height}',
+                     '-i', '-',
+                     '-y',
+                     '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                     '-profile:v', 'baseline',
+                     '-level', '3.0',
+                     '-pix_fmt', 'yuv420p',
+                     f'{self._img_base}.{_DEFAULT_MOVIE_FORMAT}'],
+                    stdin=subprocess.PIPE)
+            except OSError as err:
+                raise RuntimeError('ERROR: could not start ffmpeg: {}'.format(err))
+        self._movie_process.stdin.write(canvas.buffer_rgba())
+
     def make_movie(self, movie_fmt="mp4"):
         """
         Creates MPEG4 movie from visualization images saved.
@@ -434,6 +602,17 @@ class Graphics:
         if movie_fmt is None:
             movie_fmt = _DEFAULT_MOVIE_FORMAT
 
+        if self._stream_movie:
+            if movie_fmt != 'mp4':
+                raise ValueError('Only mp4 movies can be streamed, not: ' + movie_fmt)
+            if self._movie_process is not None:
+                self._movie_process.stdin.close()
+                if self._movie_process.wait() != 0:
+                    raise RuntimeError('ERROR: ffmpeg failed with exit code {}'.format(
+                        self._movie_process.returncode))
+                self._movie_process = None
+            return
+
         if movie_fmt == 'mp4':
             try:
                 subprocess.check_call([_FFMPEG_BINARY,
@@ -3,8 +3,10 @@ __author__ = 'Herman Ellingsen, Ole Gilje Gunnarshaug'
 __email__ = 'hermane@nmbu.no, ole.gilje.gunnarshaug@nmbu.no'
 """The island module"""
 
-from .cell import Cell
+from .cell import Cell, landtype_ids, f_max_table
 from .animal import Herbivore, Carnivore
+from . import _kernels
+import numpy as np
 
 class Island:
     """
@@ -15,63 +17,99 @@ class Island:
         self.length_map_y = None
 
     @staticmethod
-    def make_map(map):
+    def make_landscape(map):
+        """
+        Function reads in list of letters and creates an array with the landtype id of each
+        cell, see "landtype_ids" in the cell module.
+
+        :param map: String of letters describing different landtypes
+        :type map: str
+        :return: Array of landtype ids, indexed by (row, column)
+        :rtype: numpy array
+        """
+        return np.array([[landtype_ids[landtype] for landtype in line] for line in map.split()])
+
+    @staticmethod
+    def make_map(map, seed_seq=None, fodder=None):
         """
         Function reads in list of letters and creates dictionary of cells.
 
         :param map: String of letters describing different landtypes
         :type map: str
+        :param seed_seq: Seed sequence of the island. Each cell gets its own generator, seeded
+            by a child spawned from it, so the cells draw from independent streams that are all
+            given by the seed of the island.
+        :type seed_seq: numpy.random.SeedSequence
+        :param fodder: Array indexed by (row, column) where the cells keep their fodder
+        :type fodder: numpy array
         :return: :map_dicto: Dictionary where keys are coordinates(tuple) and values are Cell
-        objects.
+        objects. The coordinates are (row, column), counted from 1, while the location of a
+        cell is (column, row), counted from 0.
         :rtype: dict
         """
-        map_dicto = {(x + 1, y + 1): Cell(landtype, (x, y)) for y, line in enumerate(map.split())
+        lines = map.split()
+        n_cells = sum(len(line) for line in lines)
+        cell_rngs = iter([np.random.default_rng(child) for child in seed_seq.spawn(n_cells)]
+                         if seed_seq is not None else [None] * n_cells)
+        map_dicto = {(y + 1, x + 1): Cell(landtype, (x, y), rng=next(cell_rngs), fodder=fodder)
+                     for y, line in enumerate(lines)
                      for x, landtype in enumerate(line)}
         return map_dicto
 
-    def add_animals(self, cells, location, animals):
+    def _migrate(self, species):
         """
-        This function will perform "divide_population()" on animals in a cell with given location.
+        Moves the animals of a species that want to migrate to a random neighbour cell. The
+        migrants of all habitable cells are collected first, so that the directions of all of
+        them are drawn with one call. Migrants whose target is water stay where they are. The
+        migrants are then added to their destinations, one destination at the time.
 
-        :param cells: Dictionary containing the cells in the island
-        :type cells: dict
-        :param location: Tuple with the given location to perform function on
-        :type location: typle
-        :param animals: List of animals
-        :type animals: list
+        :param species: Herbivore or Carnivore
+        :type species: class
         """
-        cells[location].divide_population(animals)
+        sources, groups = [], []
+        for cell in self.habitable_cells:
+            migrate = cell.animals_to_migrate(species)
+            if migrate.any():
+                groups.append({column: values[migrate]
+                               for column, values in cell.get_columns(species).items()})
+                cell.keep_rows(species, ~migrate)
+                sources.append(np.repeat([cell.location[::-1]], migrate.sum(), axis=0))
+        if not groups:
+            return
+        # The locations of the cells count from 0, the coordinates of the island from 1
+        sources = np.concatenate(sources) + 1
+        targets = sources + Cell.neighbour_offsets[self.rng.integers(0, 4, size=len(sources))]
+        habitable = self.landscape[targets[:, 0] - 1, targets[:, 1] - 1] != landtype_ids["W"]
+        destinations = np.where(habitable[:, np.newaxis], targets, sources)
+
+        order = np.lexsort((destinations[:, 1], destinations[:, 0]))
+        destinations = destinations[order]
+        migrants = {column: np.concatenate([group[column] for group in groups])[order]
+                    for column in Cell.animal_attributes}
+        starts = np.flatnonzero(np.any(destinations[1:] != destinations[:-1], axis=1)) + 1
+        for first, last in zip(np.r_[0, starts], np.r_[starts, len(destinations)]):
+            destination = (int(destinations[first, 0]), int(destinations[first, 1]))
+            animals = {column: values[first:last] for column, values in migrants.items()}
+            Cell.migrate(species, animals, destination, self.cells)
 
     def migration_herbivores(self):
-        for coord in self.cells:
-            herbivores = self.cells[coord].herbivore
-            animal_to_migrate, stay = self.cells[coord].animals_to_migrate(herbivores)
-            self.cells[coord].herbivore = stay
-            for animal in animal_to_migrate:
-                target = self.cells[coord].get_target_destination(coord)
-                if self.cells[target].habitable:
-                    self.cells[coord].migrate(animal, target, self.cells)
-                else:
-                    self.cells[coord].migrate(animal, coord, self.cells)
+        """
+        Moves the herbivores that want to migrate, see :meth:`_migrate`.
+        """
+        Island._migrate(self, Herbivore)
 
     def migration_carnivores(self):
-        for coord in self.cells:
-            carnivores = self.cells[coord].carnivore
-            animal_to_migrate, stay = self.cells[coord].animals_to_migrate(carnivores)
-            self.cells[coord].carnivore = stay
-            for animal in animal_to_migrate:
-                target = self.cells[coord].get_target_destination(coord)
-                if self.cells[target].habitable:
-                    self.cells[coord].migrate(animal, target, self.cells)
-                else:
-                    self.cells[coord].migrate(animal, coord, self.cells)
-
+        """
+        Moves the carnivores that want to migrate, see :meth:`_migrate`.
+        """
+        Island._migrate(self, Carnivore)
 
     def yearly_cycle_phase_1(self):
         """
         Phase 1 of the yearly cycle on Island. This will perform the following things:
 
-        1. Update fodder in cell, depending on landtype
+        1. Update fodder in cell, depending on landtype. This is done for all cells at once,
+            by looking up the landtype of each cell in "f_max_table".
 
         2. Herbivores eat
 
@@ -79,8 +117,8 @@ class Island:
 
         4. Procreation
         """
-        for cell in self.cells.values():
-            cell.update_fodder_year()
+        self.fodder[:] = f_max_table[self.landscape]
+        for cell in self.habitable_cells:
             cell.herbivores_eat()
             cell.carnivores_eat()
             cell.add_newborns()
@@ -94,12 +132,48 @@ class Island:
         2. Update weight for all animals according to annual weight loss
 
         3. Remove all animals that die (not from carnivores eating)
-        """
 
-        for cell in self.cells.values():
-            cell.updating_age_for_entire_population()
-            cell.updating_weight_loss_for_entire_population()
-            cell.check_for_random_death()
+        The arrays of all cells are joined into one array per attribute, so that all three
+        steps are done for the whole island in one compiled, parallel kernel. The rows of cell
+        i are rows offsets[i] to offsets[i + 1] of the joined arrays. Afterwards the survivors
+        are split back into their cells, using the offsets of the survivors, which are read
+        from the cumulative sum of the survival mask.
+
+        :return: The joined arrays of the survivors for each species, keyed by species name and
+            attribute. The arrays of the cells are views into these.
+        :rtype: dict
+        """
+        population = {species.__name__: {column: np.empty(0, dtype=dtype)
+                                         for column, dtype in Cell.animal_dtypes.items()}
+                      for species in (Herbivore, Carnivore)}
+        cells = self.habitable_cells
+        if not cells:
+            return population
+        for species in (Herbivore, Carnivore):
+            columns = [cell.get_columns(species) for cell in cells]
+            island = {column: np.concatenate([c[column] for c in columns])
+                      for column in Cell.animal_attributes}
+            offsets = np.zeros(len(cells) + 1, dtype=np.intp)
+            np.cumsum([len(c["weight"]) for c in columns], out=offsets[1:])
+
+            alive = _kernels.age_and_death(island["age"], island["weight"], island["fitness"],
+                                           self.rng.random(len(island["weight"])), species._eta,
+                                           species._omega, species._phi_age, species._a_half,
+                                           species._phi_weight, species._w_half)
+            island["fitness_dirty"][:] = False
+
+            survivors = {column: values[alive] for column, values in island.items()}
+            population[species.__name__] = survivors
+
+            survived = np.zeros(len(alive) + 1, dtype=np.intp)
+            np.cumsum(alive, out=survived[1:])
+            bounds = survived[offsets].tolist()
+            prefix = Cell.species_prefix[species]
+            for column, values in survivors.items():
+                name = f"{prefix}_{column}"
+                for cell, start, stop in zip(cells, bounds[:-1], bounds[1:]):
+                    setattr(cell, name, values[start:stop])
+        return population
 
     def yearly_cycle_phase_3(self):
         """
@@ -107,5 +181,5 @@ class Island:
 
         -Reset the attributes given in "reset_attributes()" for alle animals on island.
         """
-        for cell in self.cells.values():
+        for cell in self.habitable_cells:
             cell.reset_attributes()
@@ -9,13 +9,16 @@ from .animal import Herbivore, Carnivore
 from .island import Island
 from .cell import Water, Lowland, Highland, Desert
 from .graphics import Graphics
-import random
 import numpy as np
 import csv
+import re
 
 species_population = {'Herbivore': Herbivore, "Carnivore": Carnivore}
 landscapes_types = {'L': Lowland, 'H': Highland,
                     'W': Water, 'D': Desert}
+# Rows of W, L, H and D, where the first and last row are all water and the other rows start
+# and end with water. Equal row lengths can not be expressed here, and are checked separately.
+_MAP_RE = re.compile(r"W+(?:\n(?:W(?:[WLHD]*W)?\n)*W+)?")
 
 
 class BioSim:
@@ -34,7 +37,8 @@ class BioSim:
                  img_base=None,
                  img_fmt=None,
                  img_years=None,
-                 log_file=None):
+                 log_file=None,
+                 stream_movie=False):
         """
                :param island_map: Multi-line string specifying island geography
                :param ini_pop: List of dictionaries specifying initial population
@@ -48,6 +52,8 @@ class BioSim:
                :param img_fmt: String with file type for figures, e.g. 'png'
                :param img_years: years between visualizations saved to files (default: vis_years)
                :param log_file: If given, write animal counts to this file
+               :param stream_movie: If True, frames are piped to ffmpeg instead of being saved
+                   as image files, see :meth:`make_movie`
 
                 Sjekk ut dette:
                If img_dir is None, no figures are written to file. Filenames are formed as
@@ -57,14 +63,13 @@ class BioSim:
                """
         if seed is None:
             seed = 12
-        random.seed(seed)
+        self._seed_seq = np.random.SeedSequence(seed)
+        self.rng = np.random.Generator(np.random.PCG64(self._seed_seq))
 
         self._year = 0
         self._num_animals = 0
-        Herbivore.animal_count = 0
-        Carnivore.animal_count = 0
-        self._population_history = {}
         self.log_file = log_file
+        self._log_csv = None
 
         if self.check_map(island_map):
             self.island_map = island_map
@@ -74,22 +79,26 @@ class BioSim:
             self.add_population(ini_pop)
         self.create_array()
 
-        if vis_years != 0:
-            self.vis_years = vis_years
+        # The log file is only created once the map and population have been accepted
+        if log_file is not None:
+            with open(log_file + ".csv", mode="w", newline="") as log_csv:
+                csv.writer(log_csv).writerow(["Year", "Herbivore", "Carnivore"])
 
-            self.graph = Graphics(
-                                  hist_specs=hist_specs,
-                                  img_fmt=img_fmt,
-                                  ymax_animals=ymax_animals,
-                                  cmax_animals=cmax_animals,
-                                  img_years=img_years,
-                                  img_dir=img_dir,
-                                  img_base=img_base)
-            self.graph.setup(400,
-                             self.island_map)
+        # The figure is only made when the first year is visualised, see simulate()
+        self.graph = None
+        if vis_years != 0:
+            self.vis_years = vis_years if vis_years is not None else 1
+            self._graphics_options = {"hist_specs": hist_specs,
+                                      "img_fmt": img_fmt,
+                                      "ymax_animals": ymax_animals,
+                                      "cmax_animals": cmax_animals,
+                                      "img_years": img_years,
+                                      "img_dir": img_dir,
+                                      "img_base": img_base,
+                                      "stream_movie": stream_movie}
         else:
             self.vis_years = vis_years
-            self.graph = None
+            self._graphics_options = None
 
     @staticmethod
     def set_animal_parameters(species, params):
@@ -116,18 +125,32 @@ class BioSim:
 
     def ini_cells(self):
         """
-        Initialize cells from map.
+        Initialize cells from map. The cells are also kept in a list, and the habitable ones
+        in a second list, so the yearly cycle can loop over them without going through the dict.
         """
-        self.cells = Island.make_map(self.island_map)
+        self.landscape = Island.make_landscape(self.island_map)
+        self.fodder = np.zeros(self.landscape.shape)
+        self.cells = Island.make_map(self.island_map, self._seed_seq, self.fodder)
+        self.cell_list = list(self.cells.values())
+        self.habitable_cells = [cell for cell in self.cell_list if cell.habitable]
 
     def create_array(self):
         """
         Create array for herbivores and carnivores to be used to track amount in each cell.
+        The arrays are indexed by (row, column), like the map, so they can be plotted as they
+        are. The counts are stored as unsigned integers rather than floats.
+
+        The cells are made row by row, so they are in the same order as the elements of the
+        arrays. Flat views of the arrays are therefore kept, so the counts of all cells can be
+        written to them in one operation.
         """
-        n_columns = len(self.island_map.split()[0])
-        n_rows = len(self.island_map.split())
-        self.herb_array = np.zeros(shape=(n_columns, n_rows))
-        self.carn_array = np.zeros(shape=(n_columns, n_rows))
+        lines = self.island_map.split()
+        n_rows = len(lines)
+        n_columns = len(lines[0])
+        self.herb_array = np.zeros(shape=(n_rows, n_columns), dtype=np.uint32)
+        self.carn_array = np.zeros(shape=(n_rows, n_columns), dtype=np.uint32)
+        self._herb_flat = self.herb_array.reshape(-1)
+        self._carn_flat = self.carn_array.reshape(-1)
 
     @staticmethod
     def check_map(map):
@@ -146,23 +169,12 @@ class BioSim:
         if not map:
             raise ValueError("Landscape string cannot be empty")
 
-        landscape_cells = [landscape_type for line in map.split() for landscape_type in line]
-        if not all(landscape_type in ["W", "L", "H", "D"] for landscape_type in landscape_cells):
-            raise ValueError("Landscape string cannot be empty, and can only contain:")
-
-        length_of_rows = [len(line) for line in map.split()]
-        row_length = length_of_rows[0] - 1
-
-        if not all(len(line) == length_of_rows[0] for line in map.split()):
+        lines = map.split()
+        if not all(len(line) == len(lines[0]) for line in lines):
             raise ValueError("Rows must have equal length")
 
-        for n, line in enumerate(map.split()):
-            if line[0] and line[row_length] != "W":
-                raise ValueError("Not water")
-            if n == 0 and not all(l == "W" for l in line):
-                raise ValueError("Not Water")
-            if n == len(map.split()) - 1 and not all(l == "W" for l in line):
-                raise ValueError("Not Water")
+        if not _MAP_RE.fullmatch("\n".join(lines)):
+            raise ValueError("Map can only contain W, L, H and D, and must be surrounded by water")
         return True
 
     def assign_herbs_and_carns_in_array(self):
@@ -170,104 +182,120 @@ class BioSim:
         Function assigns herbivores and carnivores into numpy array to show how many of each
         species are in each cell.
         """
-        for coord in self.cells:
-            self.herb_array[coord[0]-1][coord[1]-1] = len(self.cells[coord].herbivore)
-            self.carn_array[coord[0]-1][coord[1]-1] = len(self.cells[coord].carnivore)
+        n_cells = len(self.cell_list)
+        self._herb_flat[:] = np.fromiter((cell.number_of_herbivores for cell in self.cell_list),
+                                         dtype=np.uint32, count=n_cells)
+        self._carn_flat[:] = np.fromiter((cell.number_of_carnivores for cell in self.cell_list),
+                                         dtype=np.uint32, count=n_cells)
 
     def simulate(self, num_years):
         """
-        Run simulation while visualizing the result.
+        Run simulation while visualizing the result. The graphics are created the first time
+        this is called with graphics enabled. If a log file is given, it is kept open while
+        the years are simulated, and closed when this returns.
 
         :param num_years: number of years to simulate
         :type num_years: int
         """
-        for n in range(num_years):
-
-            dicto_hist_herb = {"age": [],
-                          "weight": [],
-                          "fitness": []}
+        if self._graphics_options is not None and num_years > 0:
+            if self.graph is None:
+                self.graph = Graphics(**self._graphics_options)
+            self.graph.setup(self._year + num_years, self.island_map)
+
+        if self.log_file is not None:
+            self._log_csv = open(self.log_file + ".csv", mode="a", newline="", buffering=1 << 16)
+            self._log_writer = csv.writer(self._log_csv)
+        try:
+            self._simulate_years(num_years)
+        finally:
+            self.close_log_file()
+
+    def _simulate_years(self, num_years):
+        """
+        Runs the yearly cycle, see :meth:`simulate`.
 
-            dicto_hist_can = {"age": [],
-                          "weight": [],
-                          "fitness": []}
+        :param num_years: number of years to simulate
+        :type num_years: int
+        """
+        for n in range(num_years):
 
             Island.yearly_cycle_phase_1(self)
 
             Island.migration_herbivores(self)
             Island.migration_carnivores(self)
 
-            Island.yearly_cycle_phase_2(self)
+            population = Island.yearly_cycle_phase_2(self)
             Island.yearly_cycle_phase_3(self)
 
-            self._population_history[self._year] = {"Herbivore": self.num_animals_per_species["Herbivore"],
-                                                    "Carnivore": self.num_animals_per_species["Carnivore"]}
-
-            self.assign_herbs_and_carns_in_array()
-            for i in self.cells:
-                for j in self.cells[i].herbivore:
-                    dicto_hist_herb["age"].append(j.age)
-                    dicto_hist_herb["weight"].append(j.weight)
-                    dicto_hist_herb["fitness"].append(j.fitness)
+            counts = self.num_animals_per_species
 
-                for carn in self.cells[i].carnivore:
-                    dicto_hist_can["age"].append(carn.age)
-                    dicto_hist_can["weight"].append(carn.weight)
-                    dicto_hist_can["fitness"].append(carn.fitness)
-
-            if self.graph:
+            if self.graph and self._year % self.vis_years != 0:
+                self.graph.record_totals(self._year, counts["Herbivore"], counts["Carnivore"])
+            elif self.graph:
+                self.assign_herbs_and_carns_in_array()
                 self.graph.update(self._year,
-                                  self.num_animals_per_species["Herbivore"],
-                                  self.num_animals_per_species["Carnivore"],
+                                  counts["Herbivore"],
+                                  counts["Carnivore"],
                                   self.herb_array,
                                   self.carn_array,
-                                  dicto_hist_herb,
-                                  dicto_hist_can)
-            self.save_log_file()
+                                  population["Herbivore"],
+                                  population["Carnivore"])
+            self.save_log_file(counts)
             self._year += 1
 
-    def return_animal(self, params):
+    def add_population(self, population):
         """
-        Returns correct species of animal
+        Add a population to the island. The ages and weights of each species are collected
+        and added to the arrays of the cell at once, without making an animal object for each
+        animal.
 
-        :param params: dictionary containing species, age and weight
-        :type params: dict
-        :return: Class instance of Carnivore or Herbivore
-        :rtype: Herbivore class og Carnivore class
+        :param population: List of dictionaries specifying population
         """
-        if params["species"] == "Herbivore":
-            return Herbivore(params["age"],
-                             params["weight"])
-        elif params["species"] == "Carnivore":
-            return Carnivore(params["age"],
-                             params["weight"])
-        else:
-            raise ValueError("Species needs to be Herbivore or Carnivore")
+        for i in population:
+            ages = {name: [] for name in species_population}
+            weights = {name: [] for name in species_population}
+            for params in i["pop"]:
+                if params["species"] not in species_population:
+                    raise ValueError("Species needs to be Herbivore or Carnivore")
+                ages[params["species"]].append(params["age"])
+                weights[params["species"]].append(params["weight"])
+            cell = self.cells[i["loc"]]
+            if not cell.habitable:
+                raise ValueError("Animals can not be placed in water")
+            for name, species in species_population.items():
+                cell.add_animals(species, ages[name], weights[name])
+
+    def save_log_file(self, counts):
+        """
+        Writes the animal counts of the current year to the log file, if a log file was given.
+        The header is written when the simulation is created. :meth:`simulate` opens the file
+        for appending, one row is added each year, and the file is closed when it returns.
 
-    def add_population(self, population):
+        :param counts: Number of animals of each species, see :attr:`num_animals_per_species`
+        :type counts: dict
         """
-        Add a population to the island
+        if self._log_csv is None:
+            return
+        self._log_writer.writerow([self._year, counts["Herbivore"], counts["Carnivore"]])
 
-        :param population: List of dictionaries specifying population
+    def close_log_file(self):
         """
-        for i in population:
-            location = i["loc"]
-            animal_population = i["pop"]
-            animals = [self.return_animal(i) for i in animal_population]
-            Island.add_animals(self, self.cells, location=location, animals=animals)
+        Flushes and closes the log file, if it is open.
+        """
+        if self._log_csv is not None:
+            self._log_csv.close()
+            self._log_csv = None
 
-    def save_log_file(self):
+    def make_movie(self, movie_fmt=None):
         """
-        Creates log file if given file name.
+        Create movie from the saved figures, or finish the movie streamed to ffmpeg if
+        stream_movie was given.
+
+        :param movie_fmt: String with movie format, 'mp4' or 'gif'
         """
-        if self.log_file is None:
-            return
-        else:
-            with open(self.log_filen + ".csv", mode="w") as log_csv:
-                headers = ["Year", "Herbivore", "Carnivore"]
-                writer = csv.writer(log_csv)
-                writer.writerow(headers)
-                for key, value in self._population_history.items():
-                    writer.writerow([key, value["Herbivore"], value["Carnivore"]])
+        if self.graph is None:
+            raise RuntimeError("Graphics are disabled, no movie can be made.")
+        self.graph.make_movie(movie_fmt)
 
     @property
     def year(self):
@@ -277,10 +305,11 @@ class BioSim:
     @property
     def num_animals(self):
         """Total number of animals on island."""
-        return Carnivore.animal_count + Herbivore.animal_count
+        return sum(self.num_animals_per_species.values())
 
     @property
     def num_animals_per_species(self):
         """Number of animals per species in island, as dictionary."""
-        return {"Herbivore": Herbivore.animal_count, "Carnivore": Carnivore.animal_count}
+        return {"Herbivore": sum(cell.number_of_herbivores for cell in self.habitable_cells),
+                "Carnivore": sum(cell.number_of_carnivores for cell in self.habitable_cells)}
 
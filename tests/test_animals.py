@@ -23,9 +23,17 @@ class TestHerbivore:
 
     def test_set_params_value_error(self):
         """Test that we get ValueError when a parameter value is less than zero"""
-        self.h.params['eta'] = -1
         with pytest.raises(ValueError):
-            self.h.set_params(self.h.params)
+            self.h.set_params({'eta': -1})
+
+    @pytest.mark.parametrize("params", [{'beta': 0.5, 'eta': -1}, {'beta': 0.5, 'eta_': 0.1}])
+    def test_set_params_invalid_changes_nothing(self, params):
+        """Test that no parameter is changed when one of the given parameters is invalid"""
+        defaults = dict(Herbivore.params)
+        with pytest.raises(ValueError):
+            Herbivore.set_params(params)
+        assert Herbivore.params == defaults
+        assert Herbivore._beta == defaults['beta']
 
     def test_herbivore_aging(self):
         """Test that a herbivores age increases with 1 for each year."""
@@ -290,7 +298,6 @@ class TestCarnivore:
         self.c = Carnivore(25, 70)
         h.fitness_update()
         self.c.fitness_update()
-        self.c.hungry = True
         self.c.amount_eaten = 10
         self.c.kill(h)
         assert self.c.weight == 70
@@ -312,6 +319,19 @@ class TestCarnivore:
         self.c.kill(h)
         assert not self.c.amount_eaten == 50
 
+    def test_carnivore_kill_limited_by_f(self, mocker):
+        """Test that a carnivore does not eat more than its F parameter."""
+        mocker.patch('random.random', return_value=0)
+        self.c.set_params({'F': 20})
+        try:
+            h = Herbivore(5, 30)
+            h.fitness_update()
+            self.c.fitness_update()
+            self.c.kill(h)
+            assert self.c.amount_eaten == 20
+        finally:
+            self.c.set_params({'F': 50})
+
     def test_carnivore_kill_proba_random_0(self, mocker):
         """Test that a carnivore decides to kill if kill probability is set to 1."""
         h = Herbivore(5, 10)
@@ -329,12 +349,13 @@ class TestCarnivore:
             assert not self.c.kill_proba(h)
 
     def test_carnivore_kill_proba_low_deltaphimax(self):
-        self.c.params['DeltaPhiMax'] = 0
+        self.c.set_params({'DeltaPhiMax': 0})
         h = Herbivore(5, 10)
         h.fitness_update()
         self.c.fitness_update()
         for _ in range(100):
             assert self.c.kill_proba(h)
+        self.c.set_params({'DeltaPhiMax': 10})
 
     def test_carnivore_decide_if_kill_random_1(self, mocker):
         """Test that a carnivore decides not to kill if kill probability is set to 0.
@@ -368,7 +389,6 @@ class TestCarnivore:
         pre_kill_weight = self.c.weight
         self.c.fitness_update()
         self.c.kill_proba(h)
-        self.c.hungry = True
         self.c.amount_eaten = 0
         self.c.kill(h)
         assert self.c.weight == pre_kill_weight + (h.weight * self.c.params["beta"])
@@ -2,7 +2,7 @@
 import pytest
 import random
 from scipy import stats
-import statistics
+import numpy as np
 
 from biosim.animal import Herbivore, Carnivore
 from biosim.cell import Cell
@@ -21,6 +21,13 @@ class TestCell:
         self.desert_cell = Cell('D', (1, 1), self.list_animals)
         self.water_cell = Cell('W', (1, 1), self.list_animals)
 
+    def test_default_animals_not_shared(self):
+        """Test that cells created without animals do not share the same list"""
+        cell_1 = Cell('L', (1, 1))
+        cell_2 = Cell('L', (2, 1))
+        cell_1.animals.append(Herbivore(5, 20))
+        assert cell_2.animals == []
+
     def test_lowland_habitable(self):
         """Test that lowland actually is habitable"""
         assert self.lowland_cell.habitable
@@ -59,14 +66,21 @@ class TestCell:
         herbivores in the cell.
         This test is landtype independent.
         """
-        self.lowland_cell.herbivore = self.herbs
+        self.lowland_cell.divide_population(self.herbs, [])
         assert self.lowland_cell.number_of_herbivores == len(self.herbs)
 
     def test_number_of_carnivores(self):
         """Test that the number_of_carnivores works."""
-        self.lowland_cell.carnivore = self.carns
+        self.lowland_cell.divide_population([], self.carns)
         assert self.lowland_cell.number_of_carnivores == len(self.carns)
 
+    def test_fodder_kept_in_island_array(self):
+        """Test that a cell keeps its fodder in the given island array, at its location"""
+        fodder = np.zeros((2, 3))
+        cell = Cell('L', (2, 1), fodder=fodder)
+        cell.fodder -= 100
+        assert fodder[1, 2] == 700
+
     def test_fodder_lowland_updates(self):  # might change this, max fodder in cell is 800?
         """Test that fodder in lowland updates in the beginning of the year."""
         self.lowland_cell.fodder = 100
@@ -80,36 +94,47 @@ class TestCell:
         assert self.highland_cell.fodder == 300
 
     def test_divide_population_herbivore(self):
-        """Test that the herbivore list only contains herbivores. landtype independent."""
-        self.lowland_cell.divide_population(self.list_animals)
-        for animal in self.lowland_cell.herbivore:
-            assert type(animal) is Herbivore
+        """Test that the herbivore arrays only contain herbivores. landtype independent."""
+        self.lowland_cell.divide_population(self.herbs, self.carns)
+        assert list(self.lowland_cell.herb_weight) == [herb.weight for herb in self.herbs]
 
     def test_divide_population_carnivore(self):
-        """Test that the carnivore list only contains carnivores. landtype independent."""
-        self.lowland_cell.divide_population(self.list_animals)
-        for animal in self.lowland_cell.carnivore:
-            assert type(animal) is Carnivore
+        """Test that the carnivore arrays only contain carnivores. landtype independent."""
+        self.lowland_cell.divide_population(self.herbs, self.carns)
+        assert list(self.lowland_cell.carn_weight) == [carn.weight for carn in self.carns]
 
     def test_target_destination(self):
         """Tests that the animals moves to one of the surrounding cells."""
         surr_cells = [(0, 1), (1, 0), (2, 1), (1, 2)]
         assert (self.lowland_cell.get_target_destination((1, 1)) in surr_cells)
 
+    def test_carnivore_fitness_updated_after_eating(self):
+        """Test that the fitness of a carnivore matches its weight after it has eaten"""
+        cell = Cell('L', (1, 1), rng=np.random.default_rng(1))
+        cell.add_animals(Herbivore, [1] * 20, [5] * 20)
+        cell.add_animals(Carnivore, [5], [40])
+        cell.carnivores_eat()
+        assert cell.carn_eaten[0] > 0
+        assert cell.carn_fitness[0] == pytest.approx(
+            Carnivore.fitness_array(cell.carn_age, cell.carn_weight)[0])
+
     def test_herbivores_eat_sort(self):
-        """Test that the herbivores gets sorted descending/ascending by fitness."""
-        self.lowland_cell.update_fitness(self.herbs)
-        self.herbs.sort(key=lambda x: x.fitness, reverse=True)
-        assert all(self.herbs[i].fitness >= self.herbs[i+1].fitness for i in range(len(self.herbs)-1))
+        """Test that the fittest herbivores eat first, when there is not enough fodder."""
+        self.lowland_cell.divide_population(self.herbs, [])
+        self.lowland_cell.herbivores_eat()
+        fitness = self.lowland_cell.herb_fitness
+        has_eaten = self.lowland_cell.herb_eaten > 0
+        assert not has_eaten.all()
+        assert fitness[has_eaten].min() >= fitness[~has_eaten].max()
 
     def test_herbivores_eat(self):
         """Test that the herbivores eat the right amount of fodder"""
         self.lowland_cell.animals = [Herbivore(5, 20) for _ in range(10)]
-        self.lowland_cell.divide_population(self.lowland_cell.animals)
-        sum_weight = sum([herb.weight for herb in self.lowland_cell.animals])
+        self.lowland_cell.divide_population(self.lowland_cell.animals, [])
+        sum_weight = self.lowland_cell.herb_weight.sum()
         self.lowland_cell.herbivores_eat()
-        sum_weight_after = sum([herb.weight for herb in self.lowland_cell.animals])
-        assert sum_weight_after == (sum_weight + 90)
+        sum_weight_after = self.lowland_cell.herb_weight.sum()
+        assert sum_weight_after == pytest.approx(sum_weight + 90)
 
     def test_herbivores_eat_less_10_fodder_cell(self):
         """
@@ -118,10 +143,10 @@ class TestCell:
         """
         self.lowland_cell.fodder = 9
         self.lowland_cell.animals = [Herbivore(5, 10)]
-        self.lowland_cell.divide_population(self.lowland_cell.animals)
+        self.lowland_cell.divide_population(self.lowland_cell.animals, [])
         self.lowland_cell.herbivores_eat()
-        new_weight = sum([herb.weight for herb in self.lowland_cell.animals])
-        assert new_weight == 10 + 9*0.9
+        new_weight = self.lowland_cell.herb_weight.sum()
+        assert new_weight == pytest.approx(10 + 9 * 0.9)
 
     def test_herbivores_eat_0_fodder_cell(self):
         """
@@ -130,7 +155,7 @@ class TestCell:
         """
         self.lowland_cell.fodder = 9
         self.lowland_cell.animals = [Herbivore(5, 10)]
-        self.lowland_cell.divide_population(self.lowland_cell.animals)
+        self.lowland_cell.divide_population(self.lowland_cell.animals, [])
         self.lowland_cell.herbivores_eat()
         assert self.lowland_cell.fodder == 0
 
@@ -138,44 +163,69 @@ class TestCell:
         """Test that a herbivore does not eat anything when there is 0 fodder in a cell."""
         self.lowland_cell.fodder = 0
         self.lowland_cell.animals = [Herbivore(5, 10)]
-        self.lowland_cell.divide_population(self.lowland_cell.animals)
-        pre_weight = sum([herb.weight for herb in self.lowland_cell.animals])
+        self.lowland_cell.divide_population(self.lowland_cell.animals, [])
+        pre_weight = self.lowland_cell.herb_weight.sum()
         self.lowland_cell.herbivores_eat()
-        post_weight = sum([herb.weight for herb in self.lowland_cell.animals])
+        post_weight = self.lowland_cell.herb_weight.sum()
         assert pre_weight == post_weight
 
     def test_fodder_eaten_removed(self):
         """Test that when an animal eats fodder it is removed from the cell."""
         herbivore = [Herbivore(5, 20) for _ in range(10)]
         herbi_cell = Cell('L', (2, 2), herbivore)
-        herbi_cell.divide_population(herbi_cell.animals)
+        herbi_cell.divide_population(herbi_cell.animals, [])
         herbi_cell.herbivores_eat()
         assert herbi_cell.fodder == 700
 
+    @staticmethod
+    def check_update_fitness(species, prefix):
+        """
+        Changes the weights of all animals in a cell, but marks only some of them as dirty.
+        Checks that update_fitness recomputes the fitness of exactly the dirty animals.
+        """
+        cell = Cell('L', (2, 2))
+        cell.add_animals(species, [5, 5, 5], [20, 20, 20])
+        fitness = getattr(cell, f"{prefix}_fitness")
+        old_fitness = fitness.copy()
+
+        getattr(cell, f"{prefix}_weight")[:] = [40, 40, 40]
+        getattr(cell, f"{prefix}_fitness_dirty")[:] = [True, False, True]
+        cell.update_fitness(species)
+
+        animal = species(5, 40)
+        animal.fitness_update()
+        assert fitness[[0, 2]] == pytest.approx([animal.fitness, animal.fitness])
+        assert fitness[1] == old_fitness[1]
+        assert fitness[0] != pytest.approx(old_fitness[0])
+        assert not getattr(cell, f"{prefix}_fitness_dirty").any()
+
     def test_update_fitness_herbivore(self):
-        """Test that update_fitness updates herbivores fitness"""
-        h = Herbivore(5, 20)
-        h_list = [Herbivore(5, 20)]
-        herbi_cell = Cell('L', (2, 2), h)
-        assert herbi_cell.update_fitness(h_list) == h.fitness_update()
+        """Test that update_fitness updates the fitness of the dirty herbivores only"""
+        self.check_update_fitness(Herbivore, "herb")
 
     def test_update_fitness_carnivore(self):
-        """Test that update_fitness updates carnivores fitness"""
-        c = Carnivore(5, 20)
-        c_list = [Carnivore(5, 20)]
-        herbi_cell = Cell('L', (2, 2), c)
-        assert herbi_cell.update_fitness(c_list) == c.fitness_update()
+        """Test that update_fitness updates the fitness of the dirty carnivores only"""
+        self.check_update_fitness(Carnivore, "carn")
 
+    def test_add_newborns_counts_not_normal(self):
+        """
+        Test that the number of animals over repeated births is not normally distributed,
+        since the population only grows until the mothers are too light to give birth.
+
+        We set the significance level to be alpha = 0.05. If the p value given from scipys
+        stats.normaltest() is lower than alpha we reject our null hypothesis and the test passes.
+        """
         results_herb = []
         results_carn = []
         alpha = 0.05
-        self.lowland_cell.divide_population(self.list_animals)
+        cell = Cell('L', (1, 1), rng=np.random.default_rng(2022))
+        cell.add_animals(Herbivore, [5] * 100, [60] * 100)
+        cell.add_animals(Carnivore, [5] * 100, [60] * 100)
 
         for _ in range(1000):
-            self.lowland_cell.add_newborns()
-            results_herb.append(len(self.lowland_cell.herbivore))
-            results_carn.append(len(self.lowland_cell.carnivore))
-        print(results_carn)
+            cell.add_newborns()
+            results_herb.append(cell.number_of_herbivores)
+            results_carn.append(cell.number_of_carnivores)
         k2_herb, p_herb = stats.normaltest(results_herb)
         k2_carn, p_carn = stats.normaltest(results_carn)
         assert p_herb < alpha
@@ -191,19 +241,22 @@ class TestCell:
 
     def test_updating_age_for_entire_population(self):
         """Test that the age updates for entire population"""
-        pre_mean_age = statistics.mean([ani.age for ani in self.lowland_cell.animals])
-        self.lowland_cell.divide_population(self.lowland_cell.animals)
+        self.lowland_cell.divide_population(self.herbs, self.carns)
+        pre_mean_age = np.concatenate((self.lowland_cell.herb_age,
+                                       self.lowland_cell.carn_age)).mean()
         self.lowland_cell.updating_age_for_entire_population()
-        post_mean_age = statistics.mean([ani.age for ani in self.lowland_cell.animals])
+        post_mean_age = np.concatenate((self.lowland_cell.herb_age,
+                                        self.lowland_cell.carn_age)).mean()
         assert post_mean_age == pytest.approx(pre_mean_age + 1)
 
     def test_updating_weight_loss_for_entire_population(self):
         """Test that the weight decreases for entire population"""
-        pre_weight = [ani.weight for ani in self.lowland_cell.animals]
-        self.lowland_cell.divide_population(self.lowland_cell.animals)
+        self.lowland_cell.divide_population(self.herbs, self.carns)
+        pre_weight = np.concatenate((self.lowland_cell.herb_weight, self.lowland_cell.carn_weight))
         self.lowland_cell.updating_weight_loss_for_entire_population()
-        assert [ani.weight != pre_ani for ani, pre_ani in
-                zip(self.lowland_cell.animals, pre_weight)]
+        post_weight = np.concatenate((self.lowland_cell.herb_weight,
+                                      self.lowland_cell.carn_weight))
+        assert (post_weight < pre_weight).all()
 
     def test_updating_weight_loss_for_entire_population_equal(self):
         """Test that the weight loss updates equally for herbivore and carnivore"""
@@ -223,9 +276,9 @@ class TestCell:
         """
         results = []
         alpha = 0.05
-        self.lowland_cell.divide_population(self.lowland_cell.animals)
+        self.lowland_cell.divide_population(self.herbs, self.carns)
         for _ in range(1000):
             self.lowland_cell.carnivores_eat()
-            results.append(len(self.lowland_cell.herbivore))
+            results.append(self.lowland_cell.number_of_herbivores)
         k2, p = stats.normaltest(results)
         assert p < alpha
@@ -1,4 +1,7 @@
 from biosim.island import Island
+from biosim.animal import Herbivore, Carnivore
+from biosim.simulation import BioSim
+import numpy as np
 import pytest
 
 
@@ -9,15 +12,126 @@ class TestIsland:
     def create_island(self):
         self.island = Island()
 
+    @pytest.fixture
+    def no_random_death(self):
+        """Sets omega to zero for both species, and restores the parameters afterwards"""
+        defaults = {species: dict(species.params) for species in (Herbivore, Carnivore)}
+        for species in defaults:
+            species.set_params({'omega': 0})
+        yield
+        for species, params in defaults.items():
+            species.set_params(params)
+
     def test_make_map(self):
         """Test that a ValueError is raised when the map contains invalid land types"""
         pass
 
+    def test_coordinates_are_row_and_column(self):
+        """Test that the cells are keyed by (row, column), counted from 1"""
+        sim = BioSim(island_map="WWWW\nWLHW\nWWWW", seed=1, vis_years=0)
+        assert sim.cells[(2, 3)].landtype == 'H'
+        assert sim.cells[(3, 2)].landtype == 'W'
+
     def test_add_animals_in_water(self):
         """Test that adding animals in water does not work"""
-        pass
+        sim = BioSim(island_map="WWW\nWLW\nWWW", seed=1, vis_years=0)
+        pop = [{'loc': (1, 2), 'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 20}]}]
+        with pytest.raises(ValueError):
+            sim.add_population(pop)
+        assert sim.num_animals == 0
 
-    def test_migration_herbivores(self):
-        """Test that herbivores migrate"""
-        pass
+    @pytest.fixture
+    def always_migrate(self):
+        """Sets mu to one for herbivores, and restores the parameters afterwards"""
+        defaults = dict(Herbivore.params)
+        Herbivore.set_params({'mu': 1})
+        yield
+        Herbivore.set_params(defaults)
+
+    @staticmethod
+    def herbivore_counts(sim):
+        """Number of herbivores in each cell of the simulation"""
+        return {coord: cell.number_of_herbivores for coord, cell in sim.cells.items()}
+
+    def test_migration_herbivores(self, always_migrate):
+        """
+        Test that fit herbivores leave the middle of a 3x3 island for all four neighbours,
+        and that no herbivore is lost or made on the way
+        """
+        pop = [{'loc': (3, 3), 'pop': [{'species': 'Herbivore', 'age': 0, 'weight': 1000}
+                                       for _ in range(100)]}]
+        sim = BioSim(island_map="WWWWW\nWLLLW\nWLLLW\nWLLLW\nWWWWW", ini_pop=pop, seed=1,
+                     vis_years=0)
+        Island.migration_herbivores(sim)
+        counts = self.herbivore_counts(sim)
+
+        assert sum(counts.values()) == 100
+        assert counts[(3, 3)] == 0
+        for coord in [(2, 3), (4, 3), (3, 2), (3, 4)]:
+            assert counts[coord] > 0
+            assert sim.cells[coord].herb_has_moved.all()
+
+    def test_migration_towards_water(self, always_migrate):
+        """Test that herbivores whose target is water stay in their cell"""
+        pop = [{'loc': (2, 2), 'pop': [{'species': 'Herbivore', 'age': 0, 'weight': 1000}
+                                       for _ in range(20)]}]
+        sim = BioSim(island_map="WWW\nWLW\nWWW", ini_pop=pop, seed=1, vis_years=0)
+        Island.migration_herbivores(sim)
+
+        assert self.herbivore_counts(sim) == {**{coord: 0 for coord in sim.cells}, (2, 2): 20}
+        assert sim.cells[(2, 2)].herb_has_moved.all()
+
+    def test_migration_only_once_per_year(self, always_migrate):
+        """Test that herbivores that have moved do not move again in the same year"""
+        pop = [{'loc': (3, 3), 'pop': [{'species': 'Herbivore', 'age': 0, 'weight': 1000}
+                                       for _ in range(100)]}]
+        sim = BioSim(island_map="WWWWW\nWLLLW\nWLLLW\nWLLLW\nWWWWW", ini_pop=pop, seed=1,
+                     vis_years=0)
+        Island.migration_herbivores(sim)
+        counts = self.herbivore_counts(sim)
+        Island.migration_herbivores(sim)
+        assert self.herbivore_counts(sim) == counts
+
+        Island.yearly_cycle_phase_3(sim)
+        Island.migration_herbivores(sim)
+        assert self.herbivore_counts(sim) != counts
+
+    def test_yearly_cycle_phase_2_multiple_cells(self, no_random_death):
+        """
+        Test that phase 2 ages every animal on the island, removes exactly the animals that
+        starve, and splits the survivors back into the right cells
+        """
+        pop = [{'loc': (2, 2),
+                'pop': [{'species': 'Herbivore', 'age': 1, 'weight': 10},
+                        {'species': 'Herbivore', 'age': 2, 'weight': 0},
+                        {'species': 'Herbivore', 'age': 3, 'weight': 20},
+                        {'species': 'Carnivore', 'age': 4, 'weight': 0},
+                        {'species': 'Carnivore', 'age': 5, 'weight': 30}]},
+               {'loc': (2, 3),
+                'pop': [{'species': 'Herbivore', 'age': 6, 'weight': 0},
+                        {'species': 'Herbivore', 'age': 7, 'weight': 0},
+                        {'species': 'Carnivore', 'age': 8, 'weight': 40},
+                        {'species': 'Carnivore', 'age': 9, 'weight': 0},
+                        {'species': 'Carnivore', 'age': 10, 'weight': 50}]},
+               {'loc': (2, 4),
+                'pop': [{'species': 'Herbivore', 'age': 11, 'weight': 60}]}]
+        sim = BioSim(island_map="WWWWW\nWLLLW\nWWWWW", ini_pop=pop, seed=1, vis_years=0)
+        population = Island.yearly_cycle_phase_2(sim)
+
+        left, middle, right = sim.cells[(2, 2)], sim.cells[(2, 3)], sim.cells[(2, 4)]
+        assert left.herb_age.tolist() == [2, 4]
+        assert middle.herb_age.tolist() == []
+        assert right.herb_age.tolist() == [12]
+        assert left.carn_age.tolist() == [6]
+        assert middle.carn_age.tolist() == [9, 11]
+        assert right.carn_age.tolist() == []
+
+        eta = Herbivore.params['eta']
+        assert left.herb_weight == pytest.approx([10 * (1 - eta), 20 * (1 - eta)])
+        assert left.herb_fitness == pytest.approx(
+            Herbivore.fitness_array(left.herb_age, left.herb_weight))
 
+        assert population['Herbivore']['age'].tolist() == [2, 4, 12]
+        assert population['Carnivore']['age'].tolist() == [6, 9, 11]
+        assert not population['Herbivore']['fitness_dirty'].any()
+        assert np.shares_memory(middle.carn_weight, population['Carnivore']['weight'])
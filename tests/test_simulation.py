@@ -23,3 +23,73 @@ def test_make_map_and_validate_edges():
     map is not water.
     """
     pass
+
+
+@pytest.mark.parametrize("island_map", ["WWW\nLLW\nWWW", "WWW\nWLL\nWWW", "WLW\nWLW\nWWW"])
+def test_check_map_border_not_water(island_map):
+    """Test that a ValueError is raised when any border cell of the map is not water"""
+    with pytest.raises(ValueError):
+        BioSim.check_map(island_map)
+
+
+def test_check_map_invalid_letter():
+    """Test that a ValueError is raised when the map contains an unknown landtype"""
+    with pytest.raises(ValueError):
+        BioSim.check_map("WWW\nWXW\nWWW")
+
+
+def test_log_file_one_row_per_year(tmp_path):
+    """Test that the log file gets a header and one row for each simulated year"""
+    log_file = str(tmp_path / "log")
+    sim = BioSim(island_map="WWW\nWLW\nWWW",
+                 ini_pop=[{"loc": (2, 2),
+                           "pop": [{"species": "Herbivore", "age": 5, "weight": 20}]}],
+                 seed=1, vis_years=0, log_file=log_file)
+    sim.simulate(3)
+    sim.simulate(2)
+    with open(log_file + ".csv") as log_csv:
+        rows = log_csv.read().splitlines()
+    assert rows[0] == "Year,Herbivore,Carnivore"
+    assert [int(row.split(",")[0]) for row in rows[1:]] == [0, 1, 2, 3, 4]
+
+
+def test_add_population_unknown_species():
+    """Test that a ValueError is raised when the population contains an unknown species"""
+    sim = BioSim(island_map="WWW\nWLW\nWWW", ini_pop=[], seed=1, vis_years=0)
+    with pytest.raises(ValueError):
+        sim.add_population([{"loc": (2, 2),
+                             "pop": [{"species": "Omnivore", "age": 5, "weight": 20}]}])
+
+
+def test_log_file_not_created_for_invalid_map(tmp_path):
+    """Test that no log file is left behind when the map is rejected"""
+    log_file = str(tmp_path / "log")
+    with pytest.raises(ValueError):
+        BioSim(island_map="WWW\nWXW\nWWW", ini_pop=[], seed=1, vis_years=0, log_file=log_file)
+    assert not (tmp_path / "log.csv").exists()
+
+
+def test_stream_movie_writes_frames_to_ffmpeg(tmp_path, mocker):
+    """
+    Test that each saved year is written to the stdin of one ffmpeg process, and that
+    make_movie closes the pipe and waits for ffmpeg to finish
+    """
+    popen = mocker.patch("biosim.graphics.subprocess.Popen")
+    ffmpeg = popen.return_value
+    ffmpeg.wait.return_value = 0
+    sim = BioSim(island_map="WWW\nWLW\nWWW", ini_pop=[], seed=1, vis_years=1,
+                 img_dir=str(tmp_path), img_base="sim", stream_movie=True)
+    sim.simulate(2)
+
+    popen.assert_called_once()
+    assert ffmpeg.stdin.write.call_count == 2
+    width, height = sim.graph._fig.canvas.get_width_height(physical=True)
+    for call in ffmpeg.stdin.write.call_args_list:
+        assert memoryview(call.args[0]).nbytes == width * height * 4
+    ffmpeg.stdin.close.assert_not_called()
+
+    sim.make_movie()
+    ffmpeg.stdin.close.assert_called_once()
+    ffmpeg.wait.assert_called_once()
+    assert [name for name, _, _ in ffmpeg.mock_calls][-2:] == ["stdin.close", "wait"]
+    assert list(tmp_path.iterdir()) == []